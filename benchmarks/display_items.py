@@ -0,0 +1,169 @@
+"""
+Time HomePage.display_items for a page of 50 item cards, rebuilding every card as the home page did
+before the item frames were pooled, against rebinding the pooled cards.
+
+Tk needs a display; on a headless machine run it under Xvfb:
+
+    xvfb-run -a python benchmarks/display_items.py
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+# The application modules live flat in pages_decorated and import each other by name
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages_decorated")
+sys.path.insert(0, PACKAGE_DIR)
+
+import migrations
+from home import HomePage, ItemFrame, StockSnapshot, item_from_row, load_items
+
+class ItemGrid:
+    """
+    The part of the home page display_items works with: a canvas holding the frame the item cards
+    are gridded in. display_items and on_canvas_configure are the home page's own methods.
+
+    Attributes:
+    - center_canvas: The canvas holding the items frame.
+    - items_frame: The frame the item cards are gridded in.
+    - stock: StockSnapshot passed to the item cards.
+    - shop_items: The items of the page being displayed.
+    - item_frames: The item cards.
+    """
+
+    display_items = HomePage.display_items
+    on_canvas_configure = HomePage.on_canvas_configure
+
+    def __init__(self, master, stock):
+        """
+        Initializes an ItemGrid.
+
+        Parameters:
+        - master: The master widget.
+        - stock: StockSnapshot passed to the item cards.
+        """
+
+        self.center_canvas = tk.Canvas(master, width=1200, height=800)
+        self.center_canvas.pack(fill="both", expand=True)
+        self.items_frame = tk.Frame(self.center_canvas)
+        self.items_frame_window_id = self.center_canvas.create_window((0, 0), window=self.items_frame, anchor="nw")
+        self.stock = stock
+        self.shop_items = []
+        self.item_frames = []
+
+    def add_to_cart(self, item):
+        pass
+
+    def destroy(self):
+        self.center_canvas.destroy()
+
+def rebuild_items(grid):
+    """
+    Display the items the way the home page did before the item frames were pooled: destroy every
+    card and build new ones, each with its own three fonts.
+
+    Parameters:
+    - grid: The ItemGrid to display the items in.
+    """
+
+    for frame in grid.item_frames:
+        frame.destroy()
+    grid.item_frames = []
+    for i, item in enumerate(grid.shop_items):
+        ItemFrame.fonts = None
+        frame = ItemFrame(grid.items_frame, grid.add_to_cart, grid.stock)
+        frame.show_item(item)
+        frame.grid(row=i // 4, column=i % 4, padx=5, pady=5, sticky="ew")
+        grid.item_frames.append(frame)
+
+    grid.items_frame.update_idletasks()
+    grid.on_canvas_configure(grid.center_canvas.winfo_width())
+
+def load_pages(db_path, count, limit):
+    """
+    Load pages of items from a migrated copy of the database, skipping the items that have no image
+    (the seeded database has one).
+
+    Parameters:
+    - db_path: Path of the database to copy.
+    - count: Number of pages.
+    - limit: Number of items on a page.
+
+    Returns:
+    - list: A list of Item objects for every page.
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "techtrolley.db")
+        shutil.copy(db_path, path)
+        db_conn = sqlite3.connect(path)
+        migrations.migrate(db_conn)
+        rows, _ = load_items(db_conn, (None, None, None, None, None, False, None), None, 2 * count * limit)
+        db_conn.close()
+
+    items = [item_from_row(row) for row in rows
+             if os.path.exists(os.path.join(PACKAGE_DIR, "images", f"{row[1]}.png"))]
+    return [items[i * limit:(i + 1) * limit] for i in range(count)]
+
+def time_display(root, pages, display, repeat):
+    """
+    Time displaying the pages in turn, including the repaint.
+
+    Parameters:
+    - root: The Tk root window.
+    - pages: List of pages of items.
+    - display: Function displaying grid.shop_items in a grid.
+    - repeat: Number of timed repaints.
+
+    Returns:
+    - list: The time of every repaint, in milliseconds.
+    """
+
+    grid = ItemGrid(root, StockSnapshot(None))
+
+    # Warm the thumbnail cache (and fill the pool) before timing
+    for page in pages:
+        grid.shop_items = page
+        display(grid)
+        root.update()
+
+    timings = []
+    for i in range(repeat):
+        grid.shop_items = pages[i % len(pages)]
+        started = time.perf_counter()
+        display(grid)
+        root.update()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    grid.destroy()
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Time displaying a page of item cards on the home page.")
+    parser.add_argument("--db", default=os.path.join(PACKAGE_DIR, "techtrolley.db"), help="Database to load the items from.")
+    parser.add_argument("--items", type=int, default=50, help="Number of items on a page.")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of timed repaints.")
+    args = parser.parse_args()
+
+    pages = load_pages(args.db, 2, args.items)
+
+    # Thumbnails are looked up relative to the application directory
+    os.chdir(PACKAGE_DIR)
+    root = tk.Tk()
+    root.geometry("1280x900")
+
+    for name, display in (("rebuild", rebuild_items), ("pooled", ItemGrid.display_items)):
+        timings = time_display(root, pages, display, args.repeat)
+        print(f"{name:8} {len(pages[0])} cards: median {statistics.median(timings):7.1f} ms, "
+              f"min {min(timings):7.1f} ms, max {max(timings):7.1f} ms")
+
+    root.destroy()
+
+if __name__ == "__main__":
+    main()
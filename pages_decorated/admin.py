@@ -1,8 +1,70 @@
 import tkinter as tk
+from tkinter import ttk
 from tkinter import messagebox, font
+import sqlite3
 from datetime import datetime
+from page import Page
 
-class AdminPage(tk.Frame):
+def save_item(db_conn, ids, item_name, brand_name, brand_nationality, price, quantity, expiry_date, category_id):
+    """
+    Add an item to the shop, or update the price, stock, expiry date and category of the item of the 
+    same name and brand. A brand entered with its nationality is added first. Runs on the database 
+    executor, in a single transaction.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - ids: IdAllocator giving new items and brands their ID.
+    - item_name: Name of the item.
+    - brand_name: Name of the brand.
+    - brand_nationality: Nationality of a new brand, or an empty string for an existing brand.
+    - price: Price of the item.
+    - quantity: Quantity in stock.
+    - expiry_date: Expiry date (YYYY-MM-DD).
+    - category_id: ID of the category.
+
+    Returns:
+    - int: ID of the item.
+    """
+
+    # Take the IDs before writing, the allocator may need the write lock
+    new_brand_id = ids.next_id("brands") if brand_nationality else None
+    new_item_id = ids.next_id("items")
+    cursor = db_conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+
+        # Insert the new brand into the database
+        if new_brand_id is not None:
+            cursor.execute("INSERT INTO brands (brand_id, name, nationality) VALUES (?, ?, ?)",
+                           (new_brand_id, brand_name, brand_nationality))
+
+        cursor.execute("SELECT brand_id FROM brands WHERE name = ?", (brand_name,))
+        row = cursor.fetchone()
+        if row is None:
+            db_conn.rollback()
+            raise ValueError(f"there is no brand named {brand_name}, enter its nationality to add it")
+        brand_id = row[0]
+
+        # Check if the item already exists, update if it does, otherwise, insert a new item
+        cursor.execute("SELECT item_id FROM items WHERE name = ? AND brand_id = ?", (item_name, brand_id))
+        row = cursor.fetchone()
+        if row:
+            item_id = row[0]
+            cursor.execute("UPDATE items SET price = ?, quantity = ?, expiry_date = ?, category_id = ? \
+                           WHERE item_id = ?",
+                           (price, quantity, expiry_date, category_id, item_id))
+        else:
+            item_id = new_item_id
+            cursor.execute("INSERT INTO items (item_id, name, brand_id, price, quantity, expiry_date, category_id) \
+                           VALUES (?, ?, ?, ?, ?, ?, ?)", 
+                           (item_id, item_name, brand_id, price, quantity, expiry_date, category_id))
+        db_conn.commit()
+    except sqlite3.Error:
+        db_conn.rollback()
+        raise
+    return item_id
+
+class AdminPage(Page):
     """
     Represents the admin page of the Tech Trolley application.
 
@@ -11,9 +73,12 @@ class AdminPage(tk.Frame):
     - switch_to_home_callback: Callback function to switch to the home page.
     - switch_to_signup_callback: Callback function to switch to the signup page.
     - db_conn: SQLite database connection.
+    - executor: DatabaseExecutor storing the items in the background.
+    - catalog: CatalogSnapshot invalidated when items change.
+    - ids: IdAllocator giving new items and brands their ID.
     """
 
-    def __init__(self, master, switch_to_home_callback, switch_to_signup_callback, db_conn):
+    def __init__(self, master, switch_to_home_callback, switch_to_signup_callback, db_conn, executor, catalog, ids):
         """
         Initialize the AdminPage.
 
@@ -22,10 +87,16 @@ class AdminPage(tk.Frame):
         - switch_to_home_callback: Callback function to switch to the home page.
         - switch_to_signup_callback: Callback function to switch to the signup page.
         - db_conn: SQLite database connection.
+        - executor: DatabaseExecutor storing the items in the background.
+        - catalog: CatalogSnapshot invalidated when items change.
+        - ids: IdAllocator giving new items and brands their ID.
         """
 
         super().__init__(master)
         self.db_conn = db_conn
+        self.executor = executor
+        self.catalog = catalog
+        self.ids = ids
         self.switch_to_home_callback = switch_to_home_callback
         self.switch_to_signup_callback = switch_to_signup_callback
 
@@ -110,14 +181,40 @@ class AdminPage(tk.Frame):
         self.expiry_date_entry = tk.Entry(self.center_frame, font=entry_font, width=25, bg='#f8f8f8')
         self.expiry_date_entry.grid(row=6, column=1, padx=20, pady=10, ipadx=5, ipady=5, sticky='ew')
 
+        # Category selection, read from the categories table
+        cursor = self.db_conn.cursor()
+        cursor.execute("SELECT category_id, name FROM categories ORDER BY name")
+        self.categories = {name: category_id for category_id, name in cursor.fetchall()}
+        self.category = tk.Label(self.center_frame, text="Category:", font=label_font, bg='#ffffff')
+        self.category.grid(row=7, column=0, padx=20, pady=10, sticky="w")
+        self.category_var = tk.StringVar()
+        self.category_combo = ttk.Combobox(self.center_frame, textvariable=self.category_var, font=entry_font,
+                                           values=list(self.categories), state="readonly", width=23)
+        self.category_combo.grid(row=7, column=1, padx=20, pady=10, ipadx=5, ipady=5, sticky='ew')
+
         # Add item button
         self.add_item_button = tk.Button(self.center_frame, text="Add Item", font=button_font, command=self.add_item)
-        self.add_item_button.grid(row=7, column=0, columnspan=2, padx=20, pady=10)
+        self.add_item_button.grid(row=8, column=0, columnspan=2, padx=20, pady=10)
 
         # Hide brand nationality initially
         self.brand_nationality.grid_remove()
         self.brand_nationality_entry.grid_remove()
 
+    def on_show(self, state):
+        """
+        Clear the add item form before the page is shown.
+
+        Parameters:
+        - state: The current Session.
+        """
+
+        for entry in (self.item_name_entry, self.brand_name_entry, self.brand_nationality_entry, self.price_entry,
+                      self.quantity_entry, self.expiry_date_entry):
+            entry.delete(0, tk.END)
+        self.category_combo.set("")
+        self.brand_nationality.grid_remove()
+        self.brand_nationality_entry.grid_remove()
+
     def brand_name_focus_out(self, event):
         """
         Handle the focus out event for the brand name entry.
@@ -152,9 +249,10 @@ class AdminPage(tk.Frame):
         price = self.price_entry.get()
         quantity = self.quantity_entry.get()
         expiry_date = self.expiry_date_entry.get()
+        category_id = self.categories.get(self.category_var.get())
 
         # Check for empty fields
-        if not item_name or not brand_name or not price or not quantity or not expiry_date:
+        if not item_name or not brand_name or not price or not quantity or not expiry_date or not category_id:
             messagebox.showerror("Add Item", "Please fill in all fields")
             return
         
@@ -175,42 +273,30 @@ class AdminPage(tk.Frame):
             messagebox.showerror("Add Item", "Invalid expiry date format. Use YYYY-MM-DD.")
             return
 
-        cursor = self.db_conn.cursor()
+        # Store the item on the database executor, blocking the button so it isn't added twice
+        self.add_item_button.configure(state="disabled")
+        self.executor.submit(save_item, self.ids, item_name, brand_name, brand_nationality, price, quantity, expiry_date,
+                             category_id, on_done=self.item_saved, on_error=self.item_failed)
 
-        # Check if brand nationality is provided
-        if brand_nationality:
-            # Generate a new brand ID
-            cursor.execute("SELECT brand_id FROM brands ORDER BY brand_id DESC LIMIT 1")
-            result = cursor.fetchone()
-            new_brand_id = int(result[0]) + 1
-            # Insert new brand into the database
-            cursor.execute("INSERT INTO brands (brand_id, name, nationality) VALUES (?, ?, ?)",
-                           (new_brand_id, brand_name, brand_nationality))
-            self.db_conn.commit()
+    def item_saved(self, item_id):
+        """
+        Report an item that was stored.
+
+        Parameters:
+        - item_id: ID of the item.
+        """
 
-        # Fetch existing item names and brand IDs from the database
-        cursor.execute("SELECT name FROM items")
-        items_names = [i[0] for i in cursor.fetchall()]
+        self.add_item_button.configure(state="normal")
+        self.catalog.invalidate()
+        messagebox.showinfo("Success", "Item added successfully")
 
-        cursor.execute("SELECT b.name FROM items AS i JOIN brands AS b ON i.brand_id = b.brand_id WHERE i.name = ?", (item_name,))
-        brands = [i[0] for i in cursor.fetchall()]
+    def item_failed(self, error):
+        """
+        Report an item that couldn't be stored.
 
-        cursor.execute("SELECT brand_id FROM brands WHERE name = ?", (brand_name,))
-        brand_id = cursor.fetchone()[0]
+        Parameters:
+        - error: The raised exception.
+        """
 
-        # Check if the item already exists, update if it does, otherwise, insert a new item
-        if item_name in items_names and brand_name in brands:
-            cursor.execute("SELECT item_id FROM items WHERE name = ? AND brand_id = ?", (item_name, brand_id))
-            item_id = cursor.fetchone()[0]
-            cursor.execute("UPDATE items SET price = ?, quantity = ?, expiry_date = ? WHERE item_id = ? AND brand_id = ?",
-                           (price, quantity, expiry_date, item_id, brand_id))
-            self.db_conn.commit()
-            messagebox.showinfo("Success", "Item added successfully")
-        else:
-            cursor.execute("SELECT item_id FROM items ORDER BY item_id DESC LIMIT 1")
-            result = cursor.fetchone()
-            item_id = int(result[0]) + 1
-            cursor.execute("INSERT INTO items (item_id, name, brand_id, price, quantity, expiry_date) VALUES (?, ?, ?, ?, ?, ?)", 
-                           (item_id, item_name, brand_id, price, quantity, expiry_date))
-            self.db_conn.commit()
-            messagebox.showinfo("Success", "Item added successfully")
\ No newline at end of file
+        self.add_item_button.configure(state="normal")
+        messagebox.showerror("Add Item", f"The item couldn't be added: {error}")
\ No newline at end of file
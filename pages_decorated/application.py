@@ -1,211 +1,294 @@
+import time
+
+# Start of the launch, taken before the imports so the startup profile includes them
+LAUNCH_STARTED = time.perf_counter()
+
+import argparse
+import importlib
+import logging
 import tkinter as tk
 from screeninfo import get_monitors
-import sqlite3
-import login, signup, payment, cart, home, admin
-import random
+import catalog, maintenance, migrations, reservations
+from database import Database
+from executor import DatabaseExecutor
+from ids import IdAllocator
+from session import Session
+from startup import StartupProfiler
+
+# Module and class of every page. The modules are imported when their page is first built
+PAGES = {
+    "login": ("login", "LoginPage"),
+    "signup": ("signup", "SignUpPage"),
+    "home": ("home", "HomePage"),
+    "admin": ("admin", "AdminPage"),
+    "cart": ("cart", "CartPage"),
+    "payment": ("payment", "PaymentPage"),
+}
 
 class MainApplication(tk.Tk):
     """
     Main application class representing the Tech Trolley application.
+
+    Attributes:
+    - fast_launch: Boolean indicating if pages are built on first use and maintenance is deferred.
+    - maintenance_delay: Milliseconds the maintenance waits after the launch in fast-launch mode.
     """
 
-    def __init__(self, geometry):
+    def __init__(self, geometry, fast_launch=False, in_memory_catalog=False, maintenance_delay=10000):
         """
         Initialize the main application.
 
         Parameters:
         - geometry (tuple): Tuple containing the width, height, x, and y coordinates of the main window.
+        - fast_launch: Whether to import and build the pages on first use and defer the maintenance, so the
+          login page shows as soon as possible.
+        - in_memory_catalog: Whether the home page filters an in-memory copy of the catalog (needs NumPy)
+          instead of querying the database, with search results ordered by item instead of relevance.
+        - maintenance_delay: Milliseconds the maintenance waits after the launch in fast-launch mode.
         """
+        self.profiler = StartupProfiler(LAUNCH_STARTED)
+        self.profiler.mark("imports")
         super().__init__()
+        self.fast_launch = fast_launch
+        self.maintenance_delay = maintenance_delay
         
         # Set up the main window
         self.title("Tech Trolley")
         self.geometry_dims = geometry
         self.configure(bg="#d9f4ff")
+        self.profiler.mark("window")
         
-        # Connect to the SQLite database
-        self.conn = sqlite3.connect("techtrolley.db")
+        # Connect to the SQLite database (WAL journaling, so other terminals can use it at the same time)
+        self.database = Database("techtrolley.db")
+        self.conn = self.database.connect()
+
+        # Bring the schema (indexes, bookkeeping tables) up to date
+        migrations.migrate(self.conn)
+        self.profiler.mark("database")
+
+        # Background threads with their own connections for the slow database work: a single writer and
+        # a pool of readers
+        self.executor = DatabaseExecutor(self, self.database)
+
+        # IDs of new rows, reserved in blocks so several terminals can share the database
+        self.ids = IdAllocator(self.database)
+
+        # In-memory copy of the catalog for the home page filters (only used when asked for and NumPy is installed)
+        self.catalog = catalog.CatalogSnapshot(enabled=in_memory_catalog)
 
         # Configure grid weights for responsiveness
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
 
-        # Initialize variables
-        self.email = None
-        self.admin = None
-        self.cart_id = None
-        self.total_price = 0
-        self.num_cart_items = 0
-
-        # Initialize different pages of the application
-        self.login_page = login.LoginPage(master=self, switch_to_signup_callback=self.switch_to_signup, 
-                                          switch_to_home_callback=self.switch_to_home, db_conn=self.conn)
-        self.signup_page = signup.SignUpPage(master=self, switch_to_login_callback=self.switch_to_login, 
-                                             db_conn=self.conn, admin=self.admin)
-        self.home_page = home.HomePage(master=self, switch_to_cart_callback=self.switch_to_cart, 
-                                       switch_to_admin_callback=self.switch_to_admin, 
-                                       switch_to_login_callback=self.switch_to_login, db_conn=self.conn, admin=self.admin, 
-                                       customer_email=self.email, cart_id=self.cart_id)
-        self.admin_page = admin.AdminPage(master=self, switch_to_home_callback=self.switch_to_home, 
-                                          switch_to_signup_callback=self.switch_to_signup, db_conn=self.conn)
-        self.cart_page = cart.CartPage(master=self, switch_to_payment_callback=self.switch_to_payment, 
-                                       switch_to_home_callback=self.switch_to_home, db_conn=self.conn, cart_id=self.cart_id)
-        self.payment_page = payment.PaymentPage(master=self, switch_to_cart_callback=self.switch_to_cart, 
-                                                switch_to_home_callback=self.switch_to_home, db_conn=self.conn, 
-                                                cart_id=self.cart_id, total_price=self.total_price, 
-                                                num_cart_items=self.num_cart_items)
+        # State of the current user session, shared by every page
+        self.session = Session()
+        self.profiler.mark("services")
+
+        # Pages are built once and refreshed when shown. Without fast launch they are all built up front
+        self.pages = {}
+        if not self.fast_launch:
+            for name in PAGES:
+                self.page(name)
+            self.profiler.mark("pages")
+        self.protocol("WM_DELETE_WINDOW", self.close)
         
         # Set window size and position
         window_size = f"{self.geometry_dims[0]}x{self.geometry_dims[1]}+{self.geometry_dims[2]}+{self.geometry_dims[3]}"
         self.geometry(window_size)
 
-        # Clean up old shopping carts
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            WITH to_be_deleted AS (
-                SELECT item_id AS id, quantity AS n
-                FROM cart_item AS ci
-                JOIN shopping_carts AS sc
-                ON ci.cart_id = sc.cart_id
-                LEFT JOIN payments AS p
-                ON sc.cart_id = p.cart_id
-                WHERE p.payment_id IS NULL
-                AND sc.creation_time <= DATE('now','-3 day')
-            )
-            UPDATE items
-            SET quantity = quantity + n
-            FROM to_be_deleted
-            WHERE item_id = id
-        """)
-        cursor.execute("""
-            DELETE FROM cart_item                 
-            WHERE cart_id IN (                          
-                SELECT sc.cart_id   
-                FROM shopping_carts AS sc                   
-                LEFT JOIN payments AS p                     
-                ON sc.cart_id = p.cart_id                   
-                WHERE p.payment_id IS NULL                    
-                AND sc.creation_time <= DATE('now','-3 day')
-            )
-        """)
-        cursor.execute("""
-            DELETE FROM shopping_carts                 
-            WHERE cart_id IN (                          
-                SELECT sc.cart_id   
-                FROM shopping_carts AS sc                   
-                LEFT JOIN payments AS p                     
-                ON sc.cart_id = p.cart_id                   
-                WHERE payment_id IS NULL                    
-                AND sc.creation_time <= DATE('now','-3 day')
-            )
-        """)
-        self.conn.commit()
-        cursor.execute("""
-            SELECT item_id
-            FROM items
-            WHERE expiry_date >= DATE('now','-7 day')
-        """)
-        items = cursor.fetchall()
-        for n, i in enumerate(items):
-            items[n] = i[0]
-        for i in items:
-            cursor.execute("SELECT discount_id FROM discounts ORDER BY discount_id DESC LIMIT 1")
-            result = cursor.fetchone()
-            discount_id = int(result[0]) + 1
-            discount = random.randint(5, 25)
-            cursor.execute(f"""INSERT INTO discounts (discount_id, item_id, discount_amount, start_date, end_date)
-                           VALUES ({discount_id}, {i}, {discount}, DATE('now'), DATE('now', '+7 day'))""")       
-            self.conn.commit()
+        # Put the stock of expired cart lines back continuously, in small batches
+        self.hold_sweeper = reservations.HoldSweeper(self, self.executor, 
+                                                     on_release=lambda released: self.catalog.invalidate())
+        self.maintenance_id = None
+        if not self.fast_launch:
+            self.start_maintenance()
+
         self.switch_to_login()
+        self.profiler.mark("login page")
+
+        # The launch is over once the login page is drawn
+        self.after_idle(self.launched)
+
+    def launched(self):
+        """
+        Log the startup timings, and schedule the deferred maintenance in fast-launch mode.
+        """
+
+        self.profiler.finish("first frame")
+        if self.fast_launch:
+            self.maintenance_id = self.after(self.maintenance_delay, self.start_maintenance)
+
+    def start_maintenance(self):
+        """
+        Start the database maintenance in the background.
+        """
+
+        self.maintenance_id = None
+
+        # Give items without an active discount a new one (no-op if already done today) and drop outdated
+        # hourly sales
+        self.executor.submit(maintenance.refresh_discounts, self.ids, on_done=lambda created: self.catalog.invalidate())
+        self.executor.submit(maintenance.prune_sales)
+        self.hold_sweeper.start()
+
+        # Clean up old shopping carts once the login page is up
+        self.after_idle(self.release_stale_carts)
+
+    def page(self, name):
+        """
+        Get a page, importing its module and building it on first use.
+
+        Parameters:
+        - name: Name of the page (a key of PAGES).
+
+        Returns:
+        - Page: The page.
+        """
+
+        page = self.pages.get(name)
+        if page is None:
+            module_name, class_name = PAGES[name]
+            page_class = getattr(importlib.import_module(module_name), class_name)
+            page = page_class(master=self, **self.page_arguments(name))
+            self.pages[name] = page
+        return page
+
+    def page_arguments(self, name):
+        """
+        Get the arguments a page is built with, besides its master.
+
+        Parameters:
+        - name: Name of the page (a key of PAGES).
+
+        Returns:
+        - dict: The keyword arguments of the page class.
+        """
+
+        if name == "login":
+            return dict(switch_to_signup_callback=self.switch_to_signup, switch_to_home_callback=self.switch_to_home, 
+                        db_conn=self.conn, session=self.session)
+        if name == "signup":
+            return dict(switch_to_login_callback=self.switch_to_login, executor=self.executor, session=self.session)
+        if name == "home":
+            return dict(switch_to_cart_callback=self.switch_to_cart, switch_to_admin_callback=self.switch_to_admin, 
+                        switch_to_login_callback=self.switch_to_login, db_conn=self.conn, executor=self.executor, 
+                        catalog=self.catalog, session=self.session, ids=self.ids)
+        if name == "admin":
+            return dict(switch_to_home_callback=self.switch_to_home, switch_to_signup_callback=self.switch_to_signup, 
+                        db_conn=self.conn, executor=self.executor, catalog=self.catalog, ids=self.ids)
+        if name == "cart":
+            return dict(switch_to_payment_callback=self.switch_to_payment, switch_to_home_callback=self.switch_to_home, 
+                        db_conn=self.conn, executor=self.executor, catalog=self.catalog, session=self.session)
+
+        # Payment page
+        return dict(switch_to_cart_callback=self.switch_to_cart, switch_to_home_callback=self.switch_to_home, 
+                    db_conn=self.conn, executor=self.executor, catalog=self.catalog, session=self.session, ids=self.ids)
+
+    def release_stale_carts(self):
+        """
+        Find the old unpaid shopping carts in the background and release them batch by batch.
+        """
+
+        self.executor.submit(maintenance.find_stale_carts, on_done=self.stale_carts_found)
+
+    def stale_carts_found(self, found):
+        """
+        Start releasing the stale carts.
+
+        Parameters:
+        - found: Number of stale carts.
+        """
+
+        if found:
+            self.executor.submit(maintenance.release_stale_cart_batch, on_done=self.stale_cart_batch_released)
+
+    def stale_cart_batch_released(self, result):
+        """
+        Release the next batch of stale carts, one transaction at a time so checkouts can run in between.
+
+        Parameters:
+        - result: Tuple containing the number of carts handled and the number of carts removed.
+        """
+
+        handled, removed = result
+        if removed:
+            self.catalog.invalidate()
+        if handled:
+            self.executor.submit(maintenance.release_stale_cart_batch, on_done=self.stale_cart_batch_released)
+
+    def show_page(self, page, **grid_options):
+        """
+        Hide the current page and show another one, refreshing it first.
+
+        Parameters:
+        - page: The page to be shown.
+        - grid_options: Grid options used to place the page.
+        """
+
+        for other in self.pages.values():
+            if other is not page and other.winfo_manager():
+                other.grid_forget()
+                other.on_hide()
+        page.on_show(self.session)
+        page.grid(row=0, column=0, **grid_options)
 
     def switch_to_signup(self):
         """
         Switch to the signup page.
         """
 
-        self.signup_page = signup.SignUpPage(master=self, switch_to_login_callback=self.switch_to_login, 
-                                             db_conn=self.conn, admin=self.admin)
-        self.login_page.grid_forget()
-        self.home_page.grid_forget()
-        self.admin_page.grid_forget()
-        self.payment_page.grid_forget()
-        self.cart_page.grid_forget()
-        self.signup_page.grid(row=0, column=0, padx=10, pady=10)
+        self.show_page(self.page("signup"), padx=10, pady=10)
 
     def switch_to_login(self):
         """
         Switch to the login page.
         """
 
-        self.login_page = login.LoginPage(master=self, switch_to_signup_callback=self.switch_to_signup, 
-                                          switch_to_home_callback=self.switch_to_home, db_conn=self.conn)
-        self.signup_page.grid_forget()
-        self.home_page.grid_forget()
-        self.admin_page.grid_forget()
-        self.payment_page.grid_forget()
-        self.cart_page.grid_forget()
-        self.login_page.grid(row=0, column=0, padx=10, pady=10)
+        self.show_page(self.page("login"), padx=10, pady=10)
 
     def switch_to_home(self):
         """
         Switch to the home page.
         """
 
-        self.home_page = home.HomePage(master=self, switch_to_cart_callback=self.switch_to_cart, 
-                                       switch_to_admin_callback=self.switch_to_admin, 
-                                       switch_to_login_callback=self.switch_to_login, db_conn=self.conn, admin=self.admin, 
-                                       customer_email=self.email, cart_id=self.cart_id)
-        self.signup_page.grid_forget()
-        self.login_page.grid_forget()
-        self.admin_page.grid_forget()
-        self.payment_page.grid_forget()
-        self.cart_page.grid_forget()
-        self.home_page.grid(row=0, column=0, sticky="nsew")
+        self.show_page(self.page("home"), sticky="nsew")
 
     def switch_to_admin(self):
         """
         Switch to the admin page.
         """
 
-        self.admin_page = admin.AdminPage(master=self, switch_to_home_callback=self.switch_to_home, 
-                                          switch_to_signup_callback=self.switch_to_signup, db_conn=self.conn)
-        self.signup_page.grid_forget()
-        self.login_page.grid_forget()
-        self.home_page.grid_forget()
-        self.admin_page.grid_forget()
-        self.payment_page.grid_forget()
-        self.cart_page.grid_forget()
-        self.admin_page.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
+        self.show_page(self.page("admin"), padx=10, pady=10, sticky="nsew")
 
     def switch_to_cart(self):
         """
         Switch to the cart page.
         """
 
-        self.cart_page = cart.CartPage(master=self, switch_to_payment_callback=self.switch_to_payment, 
-                                       switch_to_home_callback=self.switch_to_home, db_conn=self.conn, cart_id=self.cart_id)
-        self.signup_page.grid_forget()
-        self.login_page.grid_forget()
-        self.home_page.grid_forget()
-        self.admin_page.grid_forget()
-        self.payment_page.grid_forget()
-        self.cart_page.grid(row=0, column=0, sticky="nsew")
+        self.show_page(self.page("cart"), sticky="nsew")
 
     def switch_to_payment(self):
         """
         Switch to the payment page.
         """
-        
-        self.payment_page = payment.PaymentPage(master=self, switch_to_cart_callback=self.switch_to_cart, 
-                                                switch_to_home_callback=self.switch_to_home, db_conn=self.conn, 
-                                                cart_id=self.cart_id, total_price=self.total_price, 
-                                                num_cart_items=self.num_cart_items)
-        self.signup_page.grid_forget()
-        self.login_page.grid_forget()
-        self.home_page.grid_forget()
-        self.admin_page.grid_forget()
-        self.cart_page.grid_forget()
-        self.payment_page.grid(row=0, column=0, sticky="nsew")
+
+        self.show_page(self.page("payment"), sticky="nsew")
+
+    def close(self):
+        """
+        Tear down every page, stop the database executor, close the database connections and exit the application.
+        """
+
+        for page in self.pages.values():
+            page.teardown()
+        self.pages = {}
+        if self.maintenance_id is not None:
+            self.after_cancel(self.maintenance_id)
+        self.hold_sweeper.stop()
+        self.executor.shutdown()
+        self.ids.close()
+        self.conn.close()
+        self.destroy()
 
 @staticmethod
 def getScreensInfo():
@@ -221,7 +304,16 @@ def getScreensInfo():
     return first_screen.width, first_screen.height, first_screen.x, first_screen.y
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tech Trolley")
+    parser.add_argument("--fast-launch", action="store_true", 
+                        help="Build the pages on first use and defer the database maintenance")
+    parser.add_argument("--in-memory-catalog", action="store_true",
+                        help="Filter the home page from an in-memory copy of the catalog (needs NumPy)")
+    args = parser.parse_args()
+
+    # Startup timings are logged to the console
+    logging.basicConfig(level=logging.INFO, format="%(name)s: %(message)s")
 
     # Create and run the main application
-    app = MainApplication(getScreensInfo())
+    app = MainApplication(getScreensInfo(), fast_launch=args.fast_launch, in_memory_catalog=args.in_memory_catalog)
     app.mainloop()
\ No newline at end of file
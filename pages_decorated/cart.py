@@ -1,7 +1,10 @@
 import tkinter as tk
 from tkinter import messagebox, font
+from page import Page
+from cart_service import change_quantity, load_cart_items
+from reservations import renew_holds
 
-class CartPage(tk.Frame):
+class CartPage(Page):
     """
     Represents the shopping cart page of the Tech Trolley application.
 
@@ -10,10 +13,13 @@ class CartPage(tk.Frame):
     - switch_to_payment_callback: Callback function to switch to the payment page.
     - switch_to_home_callback: Callback function to switch to the home page.
     - db_conn: SQLite database connection.
-    - cart_id: ID of the current shopping cart.
+    - executor: DatabaseExecutor running the cart queries in the background.
+    - catalog: CatalogSnapshot invalidated when the stock changes.
+    - session: The current Session.
     """
 
-    def __init__(self, master, switch_to_payment_callback, switch_to_home_callback, db_conn, cart_id):
+    def __init__(self, master, switch_to_payment_callback, switch_to_home_callback, db_conn, executor, catalog, 
+                 session):
         """
         Initialize the CartPage.
 
@@ -22,12 +28,17 @@ class CartPage(tk.Frame):
         - switch_to_payment_callback: Callback function to switch to the payment page.
         - switch_to_home_callback: Callback function to switch to the home page.
         - db_conn: SQLite database connection.
-        - cart_id: ID of the current shopping cart.
+        - executor: DatabaseExecutor running the cart queries in the background.
+        - catalog: CatalogSnapshot invalidated when the stock changes.
+        - session: The current Session.
         """
 
         super().__init__(master)
         self.db_conn = db_conn
-        self.cart_id = cart_id
+        self.executor = executor
+        self.catalog = catalog
+        self.session = session
+        self.cart_items = {}
         self.switch_to_payment_callback = switch_to_payment_callback
         self.switch_to_home_callback = switch_to_home_callback
 
@@ -38,8 +49,6 @@ class CartPage(tk.Frame):
         self.configure(bg="#d9f4ff")
 
         self.create_widgets()
-        self.fetch_and_display_cart_items()
-        self.fetch_num_cart_items()
 
     def create_widgets(self):
         """
@@ -65,6 +74,10 @@ class CartPage(tk.Frame):
         self.button_cart = tk.Button(self.cart_frame, image=self.cart_image, compound = "bottom", font=button_font)
         self.button_cart.pack(side="right", padx=5, pady=5)
 
+        # Keep the cart badge in sync with the session
+        self.button_cart.configure(text=self.session.num_cart_items)
+        self.session.subscribe("num_cart_items", self.update_cart_badge)
+
         # Center frame for displaying cart items
         self.container = tk.Frame(self, bg="#ffffff", bd=2, relief="groove")
         self.container.grid(row=1, column=1, sticky="nsew", padx=50, pady=50)
@@ -77,14 +90,43 @@ class CartPage(tk.Frame):
         # center frame inside Canvas
         self.center_frame = tk.Frame(self.center_canvas, bg="#ffffff", pady=30)
         self.center_frame_window_id = self.center_canvas.create_window((0, 0), window=self.center_frame, anchor="nw")
-        self.center_canvas.bind_all("<MouseWheel>", 
-                                    lambda event: self.center_canvas.yview_scroll(-1 * (event.delta // 120), "units"))
 
-        # List to store frames displaying each item in the cart
-        self.item_frames = []
+        # Column headers
+        label_font = font.Font(family="Arial", size=14)
 
-        # Display cart items
-        self.update_item_frames()
+        # Fonts shared by the widgets of every item
+        self.button_font = button_font
+        self.label_font = label_font
+
+        lbl1 = tk.Label(self.center_frame, text="Item Name", bg="#ffffff", font=label_font)
+        lbl1.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+
+        lbl2 = tk.Label(self.center_frame, text="Item Price", bg="#ffffff", font=label_font)
+        lbl2.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+
+        lbl3 = tk.Label(self.center_frame, text="Quantity", bg="#ffffff", font=label_font)
+        lbl3.grid(row=0, column=3, padx=5, pady=5)
+
+        lbl4 = tk.Label(self.center_frame, text="Total Price", bg="#ffffff", font=label_font)
+        lbl4.grid(row=0, column=5, padx=5, pady=5, sticky="e")
+
+        # Widgets displaying each item in the cart by item ID, and the grid row of the next added item
+        self.item_frames = {}
+        self.next_row = 1
+
+        # Total frame for displaying the cart total, kept below the last item
+        self.total_frame = tk.Frame(self.center_frame, bg="#ffffff")
+        self.total_frame.grid(row=self.next_row, column=0, columnspan=6, pady=20, sticky="ew")
+
+        # Configure column weights for the total frame
+        for col in range(6):
+            self.total_frame.grid_columnconfigure(col, weight=1)
+
+        self.lbl_cart_total_text = tk.Label(self.total_frame, text="Cart Total:", bg="#ffffff", font=label_font)
+        self.lbl_cart_total_text.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+
+        self.lbl_cart_total = tk.Label(self.total_frame, text=f"${0:.2f}", bg="#ffffff", font=label_font)
+        self.lbl_cart_total.grid(row=0, column=5, sticky="e")
 
         # Proceed to payment button
         self.btn_proceed = tk.Button(self, text="Proceed to Payment", command=self.switch_to_payment_callback_check, 
@@ -93,6 +135,38 @@ class CartPage(tk.Frame):
         
         self.center_canvas.bind("<Configure>", lambda e: self.on_canvas_configure(e.width))
 
+    def on_show(self, state):
+        """
+        Reload the cart contents before the page is shown, and keep its items reserved while it is looked at.
+
+        Parameters:
+        - state: The current Session.
+        """
+
+        self.center_canvas.bind_all("<MouseWheel>", 
+                                    lambda event: self.center_canvas.yview_scroll(-1 * (event.delta // 120), "units"))
+        if state.cart_id:
+            self.executor.submit(renew_holds, state.cart_id)
+        self.fetch_and_display_cart_items()
+
+    def update_cart_badge(self, num_cart_items):
+        """
+        Show the number of items in the cart on the cart button.
+
+        Parameters:
+        - num_cart_items: Number of items in the cart.
+        """
+
+        self.button_cart.configure(text=num_cart_items)
+
+    def teardown(self):
+        """
+        Stop following the session and destroy the page.
+        """
+
+        self.session.unsubscribe("num_cart_items", self.update_cart_badge)
+        super().teardown()
+
     def on_canvas_configure(self, canvas_width):
         """
         Update the scrollregion of the canvas to the size of the center_frame
@@ -110,73 +184,100 @@ class CartPage(tk.Frame):
             
     def update_item_frames(self):
         """
-        Update the frames displaying each item in the cart.
+        Update the frames displaying each item in the cart to the loaded cart lines, only creating, 
+        changing or destroying the widgets of the lines that differ.
         """
 
-        # Destroy existing item frames
-        for frame in self.item_frames:
-            for i in frame:
-                i.destroy()
+        # Destroy the frames of the items that left the cart
+        for item_id in [item_id for item_id in self.item_frames if item_id not in self.cart_items]:
+            self.remove_item_frame(item_id)
 
-        self.item_frames.clear()
-        self.fetch_and_display_cart_items()
+        # Update the frames of the items already shown and add the new ones
+        added = False
+        for line in self.cart_items.values():
+            if line[0] in self.item_frames:
+                self.update_item_frame(line)
+            else:
+                self.add_item_frame(line)
+                added = True
 
-        # Define the font styles
-        button_font = font.Font(family="Arial", size=12, weight="bold")
-        label_font = font.Font(family="Arial", size=14)
+        self.update_cart_total()
+        if added:
+            self.update_scrollregion()
 
-        lbl1 = tk.Label(self.center_frame, text="Item Name", bg="#ffffff", font=label_font)
-        lbl1.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+    def add_item_frame(self, line):
+        """
+        Create the widgets displaying an item in the cart below the last one.
 
-        lbl2 = tk.Label(self.center_frame, text="Item Price", bg="#ffffff", font=label_font)
-        lbl2.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        Parameters:
+        - line: Tuple containing the item ID, name, price and quantity of the item.
+        """
 
-        lbl3 = tk.Label(self.center_frame, text="Quantity", bg="#ffffff", font=label_font)
-        lbl3.grid(row=0, column=3, padx=5, pady=5)
+        button_font = self.button_font
+        label_font = self.label_font
 
-        lbl4 = tk.Label(self.center_frame, text="Total Price", bg="#ffffff", font=label_font)
-        lbl4.grid(row=0, column=5, padx=5, pady=5, sticky="e")
-        
-        # Clear out any existing item frames
-        for frame in self.item_frames:
-            for i in frame:
-                i.destroy()
-        self.item_frames.clear()
-
-        # Create a frame for each cart item
-        for i, (item_id, name, price, quantity) in enumerate(self.cart_items, start=1):
-            lbl_item_name = tk.Label(self.center_frame, text=name, bg="#ffffff", font=label_font)
-            lbl_item_name.grid(row=i, column=0, padx=5, pady=5, sticky="w")
-
-            lbl_price = tk.Label(self.center_frame, text=f"${price:.2f}", bg="#ffffff", font=label_font)
-            lbl_price.grid(row=i, column=1, padx=5, pady=5, sticky="w")
-
-            btn_minus = tk.Button(self.center_frame, text="-", font=button_font,
-                                  command=lambda item_id = item_id, name = name: self.update_quantity(item_id, name, -1))
-            btn_minus.grid(row=i, column=2, padx=5, pady=5, sticky="w")
-            lbl_quantity = tk.Label(self.center_frame, text=str(quantity), bg="#ffffff", font=label_font)
-            lbl_quantity.grid(row=i, column=3, padx=5, pady=5)
-            btn_plus = tk.Button(self.center_frame, text="+", font=button_font,
-                                 command=lambda item_id = item_id, name = name: self.update_quantity(item_id, name, 1))
-            btn_plus.grid(row=i, column=4, padx=5, pady=5, sticky="w")
-
-            lbl_total = tk.Label(self.center_frame, text=f"${price * quantity:.2f}", bg="#ffffff", font=label_font)
-            lbl_total.grid(row=i, column=5, padx=5, pady=5, sticky="e")
-            self.item_frames.append([lbl_item_name, lbl_price, btn_minus, lbl_quantity, btn_plus, lbl_total])
-        
-        # Create a total frame for displaying the cart total
-        self.total_frame = tk.Frame(self.center_frame,bg="#ffffff")
-        self.total_frame.grid(row=len(self.cart_items) + 1, column=0, columnspan=6, pady=20, sticky="ew")
+        item_id, name, price, quantity = line
+        i = self.next_row
+        self.next_row += 1
 
-        # Configure column weights for the total frame
-        for col in range(6):
-            self.total_frame.grid_columnconfigure(col, weight=1)
+        lbl_item_name = tk.Label(self.center_frame, text=name, bg="#ffffff", font=label_font)
+        lbl_item_name.grid(row=i, column=0, padx=5, pady=5, sticky="w")
 
-        self.lbl_cart_total_text = tk.Label(self.total_frame, text="Cart Total:", bg="#ffffff", font=label_font)
-        self.lbl_cart_total_text.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        lbl_price = tk.Label(self.center_frame, text=f"${price:.2f}", bg="#ffffff", font=label_font)
+        lbl_price.grid(row=i, column=1, padx=5, pady=5, sticky="w")
 
-        self.lbl_cart_total = tk.Label(self.total_frame, text=f"${self.calculate_total():.2f}", bg="#ffffff", font=label_font)
-        self.lbl_cart_total.grid(row=0, column=5, sticky="e")
+        btn_minus = tk.Button(self.center_frame, text="-", font=button_font,
+                              command=lambda item_id = item_id, name = name: self.update_quantity(item_id, name, -1))
+        btn_minus.grid(row=i, column=2, padx=5, pady=5, sticky="w")
+        lbl_quantity = tk.Label(self.center_frame, text=str(quantity), bg="#ffffff", font=label_font)
+        lbl_quantity.grid(row=i, column=3, padx=5, pady=5)
+        btn_plus = tk.Button(self.center_frame, text="+", font=button_font,
+                             command=lambda item_id = item_id, name = name: self.update_quantity(item_id, name, 1))
+        btn_plus.grid(row=i, column=4, padx=5, pady=5, sticky="w")
+
+        lbl_total = tk.Label(self.center_frame, text=f"${price * quantity:.2f}", bg="#ffffff", font=label_font)
+        lbl_total.grid(row=i, column=5, padx=5, pady=5, sticky="e")
+        self.item_frames[item_id] = [lbl_item_name, lbl_price, btn_minus, lbl_quantity, btn_plus, lbl_total]
+
+        # Keep the cart total below the new item
+        self.total_frame.grid(row=self.next_row)
+
+    def update_item_frame(self, line):
+        """
+        Show the current price, quantity and total price of an item in the cart.
+
+        Parameters:
+        - line: Tuple containing the item ID, name, price and quantity of the item.
+        """
+
+        item_id, _, price, quantity = line
+        _, lbl_price, _, lbl_quantity, _, lbl_total = self.item_frames[item_id]
+        lbl_price.configure(text=f"${price:.2f}")
+        lbl_quantity.configure(text=str(quantity))
+        lbl_total.configure(text=f"${price * quantity:.2f}")
+
+    def remove_item_frame(self, item_id):
+        """
+        Destroy the widgets displaying an item in the cart.
+
+        Parameters:
+        - item_id: ID of the item.
+        """
+
+        for widget in self.item_frames.pop(item_id):
+            widget.destroy()
+
+    def update_cart_total(self):
+        """
+        Show the total price of the loaded cart items.
+        """
+
+        self.lbl_cart_total.configure(text=f"${self.calculate_total():.2f}")
+
+    def update_scrollregion(self):
+        """
+        Update the scrollregion and position of the center frame after items were added.
+        """
 
         self.center_frame.update_idletasks()
         self.on_canvas_configure(self.center_canvas.winfo_width())
@@ -186,40 +287,33 @@ class CartPage(tk.Frame):
         Switch to the payment page.
         """
         
-        self.fetch_num_cart_items()
         # Check if there are items in the cart
-        if self.num_cart_items:
+        if self.session.num_cart_items:
             self.switch_to_payment_callback()
         else:
             messagebox.showinfo("Cart", "Your cart is empty. Please add items before proceeding to payment.")
 
-    def fetch_num_cart_items(self):
+    def fetch_and_display_cart_items(self):
         """
-        Fetch and update the number of items in the cart.
+        Fetch the items in the cart in the background and display them once loaded.
         """
 
-        cursor = self.db_conn.cursor()
-        cursor.execute("SELECT COUNT(i.name) \
-                       FROM items AS i \
-                       JOIN cart_item AS ci \
-                       ON i.item_id = ci.item_id \
-                       WHERE ci.cart_id = ?", (self.cart_id,))
-        self.num_cart_items = cursor.fetchone()[0]
-        self.master.num_cart_items = self.num_cart_items
-        self.button_cart.configure(text=self.num_cart_items)
+        self.executor.submit(load_cart_items, self.session.cart_id, on_done=self.show_cart_items, key="cart items",
+                             read_only=True)
 
-    def fetch_and_display_cart_items(self):
+    def show_cart_items(self, cart_items):
         """
-        Fetch and display the items in the cart.
+        Display the loaded cart lines and update the number of items and total price of the session.
+
+        Parameters:
+        - cart_items: Tuples containing the item ID, name, price and quantity of every line.
         """
 
-        cursor = self.db_conn.cursor()
-        cursor.execute("SELECT i.item_id, i.name, i.price, ci.quantity \
-                       FROM items AS i \
-                       JOIN cart_item AS ci \
-                       ON i.item_id = ci.item_id \
-                       WHERE ci.cart_id = ?", (self.cart_id,))
-        self.cart_items = cursor.fetchall()
+        self.cart_items = {line[0]: line for line in cart_items}
+
+        # The count and total follow from the loaded lines, no need to query them separately
+        self.session.update(num_cart_items=len(self.cart_items), total_price=self.calculate_total())
+        self.update_item_frames()
 
     def update_quantity(self, item_id, name, change):
         """
@@ -231,71 +325,60 @@ class CartPage(tk.Frame):
         - change: The change in quantity (1 for increase, -1 for decrease).
         """
 
-        cursor = self.db_conn.cursor()
-
-        # Decrease quantity and update stock if decreasing
-        if change == -1:
-            cursor.execute("UPDATE cart_item SET quantity = quantity - 1 WHERE cart_id = ? AND item_id = ?", (self.cart_id, item_id))
-            cursor.execute("UPDATE items SET quantity = quantity + 1 WHERE item_id = ?", (item_id,))
-        else:
-            # Check stock before increasing quantity
-            cursor.execute("SELECT quantity FROM items WHERE item_id = ?", (item_id,))
-            self.stock_quantity = cursor.fetchone()[0]
-            if self.stock_quantity > 0:
-                cursor.execute("UPDATE cart_item SET quantity = quantity + 1 WHERE cart_id = ? AND item_id = ?", (self.cart_id, item_id))
-                cursor.execute("UPDATE items SET quantity = quantity - 1 WHERE item_id = ?", (item_id,))
-            else:
-                messagebox.showerror("Items", f"No more in stock")
+        # Confirm the removal of the item before its quantity reaches zero
+        line = self.cart_items.get(item_id)
+        if line is not None and line[3] + change <= 0:
+            response = messagebox.askokcancel("Confirm Deletion", f"Are you sure you want to remove {name} from your cart?")
+            if not response:
+                return
 
-        # Commit changes to the database
-        self.db_conn.commit()
+        self.executor.submit(change_quantity, self.session.cart_id, item_id, change,
+                             on_done=lambda result: self.quantity_changed(item_id, name, result))
 
-        # Update the cart total label
-        self.lbl_cart_total.configure(text=f"${self.calculate_total():.2f}")
+    def quantity_changed(self, item_id, name, result):
+        """
+        Show the cart after a quantity change.
 
-        # Fetch the new quantity
-        cursor.execute("SELECT quantity FROM cart_item WHERE cart_id = ? AND item_id = ?", (self.cart_id, item_id))
-        new_quantity = cursor.fetchone()[0]
+        Parameters:
+        - item_id: ID of the updated item.
+        - name: Name of the item.
+        - result: Tuple containing a boolean indicating if the quantity changed, the new line (None if it was 
+          removed, or released because its hold expired), the number of cart items and the total price.
+        """
 
-        # Check if the quantity is zero or less, and confirm deletion
-        if new_quantity <= 0:
-            response = messagebox.askokcancel("Confirm Deletion", f"Are you sure you want to remove {name} from your cart?")
-            if response:
-                # Remove the item from the cart
-                cursor.execute("DELETE FROM cart_item WHERE cart_id = ? AND item_id = ?", (self.cart_id, item_id))
-                messagebox.showinfo("Cart", f"Item {name} has been removed from your cart.")
-                if self.num_cart_items <= 0:
-                    cursor.execute("DELETE FROM shopping_carts WHERE cart_id = ?", (self.cart_id,))
-                    self.cart_id = None
-                    self.master.cart_id = None
-            else:
-                # Revert changes if deletion is canceled
-                cursor.execute("UPDATE cart_item SET quantity = quantity + 1 WHERE cart_id = ? AND item_id = ?", (self.cart_id, item_id))
-                cursor.execute("UPDATE items SET quantity = quantity - 1 WHERE item_id = ?", (item_id,))
+        changed, line, num_cart_items, total_price = result
+        if not changed and line is not None:
+            messagebox.showerror("Items", f"No more in stock")
+            return
+        self.catalog.invalidate()
+
+        # Only the changed line is redrawn, the rest of the cart is unchanged
+        if line is None:
+            if item_id in self.cart_items:
+                del self.cart_items[item_id]
+                self.remove_item_frame(item_id)
+        else:
+            self.cart_items[item_id] = line
+            self.update_item_frame(line)
+        self.update_cart_total()
 
-        # Commit changes to the database
-        self.db_conn.commit()
+        # Removing the last line removes the cart as well (a cart emptied by expired holds is left to the
+        # stale cart cleanup), the next item added starts a new one
+        if num_cart_items == 0:
+            self.session.update(cart_id=None)
+        self.session.update(num_cart_items=num_cart_items, total_price=total_price)
 
-        # Update the number of cart items and refresh the item frames
-        self.fetch_num_cart_items()
-        self.button_cart.configure(text=self.num_cart_items)
-        self.total_frame.destroy()
-        self.update_item_frames()
+        if not changed:
+            messagebox.showerror("Cart", f"The reservation of {name} expired and it was removed from your cart.")
+        elif line is None:
+            messagebox.showinfo("Cart", f"Item {name} has been removed from your cart.")
 
     def calculate_total(self):
         """
-        Calculate the total price of items in the cart.
+        Calculate the total price of the loaded cart items.
 
         Returns:
         - float: The total price.
         """
         
-        cursor = self.db_conn.cursor()
-        cursor.execute("""SELECT SUM(i.price * ci.quantity)
-                       FROM items AS i
-                       JOIN cart_item AS ci
-                       ON i.item_id = ci.item_id
-                       WHERE ci.cart_id = ?""", (self.cart_id,))
-        total = cursor.fetchone()[0]
-        self.master.total_price = total
-        return total if total else 0.0
+        return float(sum(price * quantity for _, _, price, quantity in self.cart_items.values()))
@@ -0,0 +1,152 @@
+import sqlite3
+from datetime import datetime
+from reservations import hold_modifier
+
+def load_cart_items(db_conn, cart_id):
+    """
+    Fetch the lines of a cart. Runs on the database executor.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - cart_id: ID of the shopping cart.
+
+    Returns:
+    - list: Tuples containing the item ID, name, price and quantity of every line.
+    """
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT i.item_id, i.name, i.price, ci.quantity \
+                   FROM items AS i \
+                   JOIN cart_item AS ci \
+                   ON i.item_id = ci.item_id \
+                   WHERE ci.cart_id = ?", (cart_id,))
+    return cursor.fetchall()
+
+def cart_summary(cursor, cart_id, item_id):
+    """
+    Read one line of a cart together with the number of lines and the total price of the cart.
+
+    Parameters:
+    - cursor: SQLite cursor.
+    - cart_id: ID of the shopping cart.
+    - item_id: ID of the item of the line.
+
+    Returns:
+    - tuple: The line (item ID, name, price, quantity) or None if the item is not in the cart, the number of 
+      lines and the total price.
+    """
+
+    cursor.execute("SELECT i.item_id, i.name, i.price, ci.quantity \
+                   FROM items AS i \
+                   JOIN cart_item AS ci \
+                   ON i.item_id = ci.item_id \
+                   WHERE ci.cart_id = ? AND ci.item_id = ?", (cart_id, item_id))
+    line = cursor.fetchone()
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(i.price * ci.quantity), 0) \
+                   FROM cart_item AS ci \
+                   JOIN items AS i \
+                   ON i.item_id = ci.item_id \
+                   WHERE ci.cart_id = ?", (cart_id,))
+    num_cart_items, total_price = cursor.fetchone()
+    return line, num_cart_items, float(total_price)
+
+def add_item(db_conn, cart_id, customer_email, item_id, quantity):
+    """
+    Move units of an item from the stock into a cart in a single transaction, creating the cart if it 
+    doesn't exist yet. Adding an item that is already in the cart adds to its line. Runs on the 
+    database executor.
+
+    The cart ID is reserved by the caller before the first item is added, so items added while an 
+    earlier add is still pending all go to the same cart. Like change_quantity, the write lock is taken 
+    up front (BEGIN IMMEDIATE) and the stock is only taken if enough units are left.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - cart_id: ID of the customer's shopping cart.
+    - customer_email: Email of the customer.
+    - item_id: ID of the item.
+    - quantity: Number of units to add.
+
+    Returns:
+    - tuple: Boolean indicating if the item was added (False when out of stock), followed by the 
+      result of cart_summary after the change.
+    """
+
+    cursor = db_conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+
+        # Take the units from the stock only if enough are left
+        cursor.execute("UPDATE items SET quantity = quantity - ? WHERE item_id = ? AND quantity >= ?", 
+                       (quantity, item_id, quantity))
+        if cursor.rowcount == 0:
+            db_conn.rollback()
+            return (False,) + cart_summary(cursor, cart_id, item_id)
+
+        # The first line added creates the cart
+        cursor.execute("INSERT INTO shopping_carts (cart_id, customer_email, creation_time) VALUES (?, ?, ?) \
+                       ON CONFLICT (cart_id) DO NOTHING", (cart_id, customer_email, datetime.now()))
+
+        # Add the line, or add to it if it is already in the cart, and start its hold on the stock
+        cursor.execute("INSERT INTO cart_item (cart_id, item_id, quantity, hold_expires_at) \
+                       VALUES (?, ?, ?, datetime('now', ?)) \
+                       ON CONFLICT (cart_id, item_id) DO UPDATE \
+                       SET quantity = quantity + excluded.quantity, hold_expires_at = excluded.hold_expires_at", 
+                       (cart_id, item_id, quantity, hold_modifier()))
+        summary = cart_summary(cursor, cart_id, item_id)
+        db_conn.commit()
+    except sqlite3.Error:
+        db_conn.rollback()
+        raise
+    return (True,) + summary
+
+def change_quantity(db_conn, cart_id, item_id, change):
+    """
+    Move units of an item between the stock and a cart in a single transaction. A line whose quantity 
+    reaches zero is removed, and the cart with it if it was its last line. Runs on the database executor.
+
+    The write lock is taken up front (BEGIN IMMEDIATE) and both updates are conditional, so the stock 
+    never goes negative even with several terminals changing the same item.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - cart_id: ID of the shopping cart.
+    - item_id: ID of the item.
+    - change: The change in quantity (e.g. 1 for increase, -1 for decrease).
+
+    Returns:
+    - tuple: Boolean indicating if the quantity changed (False when out of stock), followed by the 
+      result of cart_summary after the change.
+    """
+
+    cursor = db_conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+
+        # Change the line only if its quantity stays non-negative, and restart its hold on the stock
+        cursor.execute("UPDATE cart_item SET quantity = quantity + ?, hold_expires_at = datetime('now', ?) \
+                       WHERE cart_id = ? AND item_id = ? AND quantity + ? >= 0 \
+                       RETURNING quantity", (change, hold_modifier(), cart_id, item_id, change))
+        row = cursor.fetchone()
+
+        # Take the units from the stock only if enough are left
+        changed = row is not None
+        if changed:
+            cursor.execute("UPDATE items SET quantity = quantity - ? WHERE item_id = ? AND quantity >= ?", 
+                           (change, item_id, max(change, 0)))
+            changed = cursor.rowcount == 1
+        if not changed:
+            db_conn.rollback()
+            return (False,) + cart_summary(cursor, cart_id, item_id)
+
+        # Remove the emptied line, and the cart if nothing is left in it
+        if row[0] <= 0:
+            cursor.execute("DELETE FROM cart_item WHERE cart_id = ? AND item_id = ?", (cart_id, item_id))
+        summary = cart_summary(cursor, cart_id, item_id)
+        if summary[1] == 0:
+            cursor.execute("DELETE FROM shopping_carts WHERE cart_id = ?", (cart_id,))
+        db_conn.commit()
+    except sqlite3.Error:
+        db_conn.rollback()
+        raise
+    return (True,) + summary
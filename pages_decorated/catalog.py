@@ -0,0 +1,263 @@
+import importlib.util
+import re
+import threading
+import time
+
+# NumPy is optional, without it (or without --in-memory-catalog) the home page queries SQLite for every
+# filter change. It is imported when the first snapshot is loaded, to keep it off the startup path
+np = None
+
+WORD = re.compile(r"\w+")
+
+def search_tokens(text):
+    """
+    Split text into lowercase words the way the full-text index tokenizes it.
+
+    Parameters:
+    - text: The text to be split.
+
+    Returns:
+    - list: The words of the text.
+    """
+
+    return WORD.findall(text.lower()) if text else []
+
+class CatalogSnapshot:
+    """
+    In-memory copy of the shop catalog, filtered with vectorized NumPy operations.
+
+    The items with their brand, sales, active discount and Egyptian share are loaded with one query
+    into columnar arrays, and every filter combination is then answered from memory. The snapshot is
+    reloaded after invalidate() is called by the code writing to this process's database, when the
+    data_version of the reader connection shows another connection (e.g. another terminal or the
+    maintenance CLI) committed since it last checked, and after max_age seconds so that time based
+    values (sales in the last 24 hours, active discounts) stay fresh. It is only loaded and queried on
+    the reader threads of the database executor, one query at a time.
+
+    Search matches every word as a prefix like the full-text index does, but results are ordered by
+    item ID instead of relevance, which is why the snapshot is off unless it is asked for.
+
+    Attributes:
+    - enabled: Boolean indicating if the snapshot was asked for, NumPy is available and the snapshot is used.
+    - max_age: Seconds after which the snapshot is reloaded even without writes.
+    - version: Counter bumped by every invalidation.
+    - data_versions: Dictionary mapping every reader connection to the data_version it had when it
+      last saw the snapshot current.
+    """
+
+    def __init__(self, enabled=False, max_age=300):
+        """
+        Initialize an empty CatalogSnapshot.
+
+        Parameters:
+        - enabled: Whether the home page should use the snapshot (only if NumPy is installed).
+        - max_age: Seconds after which the snapshot is reloaded even without writes.
+        """
+
+        self.enabled = enabled and importlib.util.find_spec("numpy") is not None
+        self.max_age = max_age
+        self.version = 0
+        self.loaded_version = None
+        self.loaded_at = None
+        self.data_versions = {}
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        """
+        Mark the snapshot as outdated, e.g. after stock, prices, discounts or sales changed.
+        """
+
+        self.version += 1
+
+    def is_current(self, db_conn):
+        """
+        Check whether the loaded snapshot can still be used.
+
+        PRAGMA data_version changes when another connection commits, but every connection counts on
+        its own. A reader connection the snapshot hasn't been checked on yet, or one that saw a commit,
+        therefore reloads it once; the versions of the other readers stay valid, as they still show
+        whether anything was committed since they last checked.
+
+        Parameters:
+        - db_conn: SQLite database connection the snapshot is queried on.
+
+        Returns:
+        - bool: True if the snapshot is loaded, not invalidated, not changed by another connection and not too old.
+        """
+
+        data_version = db_conn.execute("PRAGMA data_version").fetchone()[0]
+        return (self.loaded_version == self.version and self.loaded_at is not None
+                and time.monotonic() - self.loaded_at < self.max_age
+                and self.data_versions.get(db_conn) == data_version)
+
+    def load(self, db_conn):
+        """
+        Load the catalog from the database into columnar arrays.
+
+        Parameters:
+        - db_conn: SQLite database connection.
+        """
+
+        global np
+        if np is None:
+            import numpy as np
+
+        # The item statistics are shared with the home page queries
+        from home import ITEM_STATS, item_stats_values
+
+        version = self.version
+        data_version = db_conn.execute("PRAGMA data_version").fetchone()[0]
+        cursor = db_conn.cursor()
+        cursor.execute(ITEM_STATS + """
+            SELECT i.item_id, i.name, i.quantity, i.price, b.name, b.nationality,
+            s.sold, s24.sold_24h, d.discount_amount, e.egyptian_share,
+            i.category_id, c.name, i.item_id IN (SELECT item_id FROM discounts)
+            FROM items i
+            JOIN brands b ON i.brand_id = b.brand_id
+            LEFT JOIN categories AS c ON c.category_id = i.category_id
+            LEFT JOIN item_sales AS s ON s.item_id = i.item_id
+            LEFT JOIN item_sold_24h AS s24 ON s24.item_id = i.item_id
+            LEFT JOIN active_discounts AS d ON d.item_id = i.item_id
+            LEFT JOIN brand_attributes AS e ON e.brand_id = i.brand_id
+            ORDER BY i.item_id
+        """, item_stats_values())
+        rows = cursor.fetchall()
+
+        # Rows keep the display values, the arrays hold the filtered columns in the same order
+        self.rows = rows
+        self.item_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.quantities = np.array([row[2] for row in rows], dtype=np.int64)
+        self.prices = np.array([row[3] for row in rows], dtype=np.float64)
+        self.category_ids = np.array([row[10] if row[10] is not None else -1 for row in rows], dtype=np.int64)
+        self.discounted = np.array([bool(row[12]) for row in rows], dtype=bool)
+
+        # Brand names and nationalities are compared as integer codes
+        self.brand_codes, self.brands = self.encode([row[4] for row in rows])
+        self.nationality_codes, self.nationalities = self.encode([row[5] for row in rows])
+
+        # Sorted words of name, category and brand with the index of their item, so a prefix is found
+        # with a binary search. The full text is kept for the rare search words made of several words
+        # (e.g. "coca-cola"), one part per field so phrases don't span fields
+        words, word_items, search_text = [], [], []
+        for index, row in enumerate(rows):
+            fields = [search_tokens(field) for field in (row[1], row[11], row[4])]
+            for tokens in fields:
+                words += tokens
+                word_items += [index] * len(tokens)
+            search_text.append(" " + " | ".join(" ".join(tokens) for tokens in fields))
+        words = np.array(words, dtype=str)
+        order = np.argsort(words, kind="stable")
+        self.words = words[order]
+        self.word_items = np.array(word_items, dtype=np.int64)[order]
+        self.search_text = np.array(search_text, dtype=str)
+
+        self.loaded_version = version
+        self.loaded_at = time.monotonic()
+        self.data_versions[db_conn] = data_version
+
+    def encode(self, values):
+        """
+        Encode a column of strings as integer codes.
+
+        Parameters:
+        - values: List of strings.
+
+        Returns:
+        - tuple: Array of codes and dictionary mapping every string to its code.
+        """
+
+        codes = {}
+        encoded = np.array([codes.setdefault(value, len(codes)) for value in values], dtype=np.int64)
+        return encoded, codes
+
+    def query(self, db_conn, filters, page_cursor, limit):
+        """
+        Fetch a page of items from the snapshot, reloading it first if it is outdated. Runs on the database executor.
+
+        Parameters:
+        - db_conn: SQLite database connection.
+        - filters: Tuple built by HomePage.normalized_filters.
+        - page_cursor: The (item ID, item ID) of the last row of the previous page, or None for the first page.
+        - limit: Number of items on a page.
+
+        Returns:
+        - tuple: List of item rows (see item_from_row) and the cursor of the next page (None on the last page).
+        """
+
+        with self.lock:
+            if not self.is_current(db_conn):
+                self.load(db_conn)
+            indexes = np.flatnonzero(self.filter_mask(filters, page_cursor))[:limit + 1]
+            rows = [self.rows[i] for i in indexes]
+
+        next_cursor = (rows[limit - 1][0], rows[limit - 1][0]) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def filter_mask(self, filters, page_cursor):
+        """
+        Compute which items of the snapshot match the filters.
+
+        Parameters:
+        - filters: Tuple built by HomePage.normalized_filters.
+        - page_cursor: The (item ID, item ID) of the last row of the previous page, or None for the first page.
+
+        Returns:
+        - numpy.ndarray: Boolean mask over the items of the snapshot.
+        """
+
+        brand_name_filter, brand_nationality_filter, category_filter, min_price_filter, max_price_filter, \
+        on_discount_filter, search_filter = filters
+
+        # Only show items that are in stock
+        mask = self.quantities > 0
+
+        if brand_name_filter:
+            mask &= self.brand_codes == self.brands.get(brand_name_filter, -1)
+
+        if brand_nationality_filter:
+            mask &= self.nationality_codes == self.nationalities.get(brand_nationality_filter, -1)
+
+        if category_filter:
+            mask &= self.category_ids == category_filter
+
+        if min_price_filter:
+            mask &= self.prices >= min_price_filter
+
+        if max_price_filter:
+            mask &= self.prices <= max_price_filter
+
+        if on_discount_filter:
+            mask &= self.discounted
+
+        # Every search word has to start a word of the item, like the prefix queries of the full-text index.
+        # A word without any letters or digits (e.g. a lone quote) matches nothing there either
+        if search_filter:
+            for word in search_filter.split():
+                tokens = search_tokens(word)
+                if len(tokens) == 1:
+                    mask &= self.prefix_mask(tokens[0])
+                elif tokens:
+                    mask &= np.char.find(self.search_text, " " + " ".join(tokens)) >= 0
+                else:
+                    return np.zeros(len(self.rows), dtype=bool)
+
+        if page_cursor:
+            mask &= self.item_ids > page_cursor[1]
+        return mask
+
+    def prefix_mask(self, prefix):
+        """
+        Compute which items have a word starting with the given prefix.
+
+        Parameters:
+        - prefix: Lowercase prefix of a word.
+
+        Returns:
+        - numpy.ndarray: Boolean mask over the items of the snapshot.
+        """
+
+        start = np.searchsorted(self.words, prefix, side="left")
+        end = np.searchsorted(self.words, prefix + "\U0010ffff", side="left")
+        mask = np.zeros(len(self.rows), dtype=bool)
+        mask[self.word_items[start:end]] = True
+        return mask
@@ -0,0 +1,100 @@
+import sqlite3
+import time
+
+# Settings of every connection. WAL lets readers and the writer work at the same time, and with WAL a
+# commit only needs to reach the log, so synchronous=NORMAL stays safe against application crashes
+PRAGMAS = [
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -20000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+]
+
+def is_busy(error):
+    """
+    Check whether an error was caused by another connection holding a lock on the database.
+
+    Parameters:
+    - error: The raised exception.
+
+    Returns:
+    - bool: True if retrying the work later may succeed.
+    """
+
+    return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+def retry(function, db_conn, *args, attempts=5, delay=0.05):
+    """
+    Call a function doing database work, retrying it with exponential backoff while the database is busy.
+
+    The busy timeout already waits for locks, but SQLite gives up at once when waiting cannot help, e.g. 
+    when a transaction that started reading has to write after another connection committed. The work 
+    is then rolled back and started over.
+
+    Parameters:
+    - function: Function called as function(db_conn, *args). It must be safe to run again after a rollback.
+    - db_conn: SQLite database connection.
+    - args: Extra arguments passed to the function.
+    - attempts: Maximum number of calls.
+    - delay: Seconds waited before the first retry, doubled after every attempt.
+
+    Returns:
+    - The result of the function.
+    """
+
+    for attempt in range(attempts):
+        try:
+            return function(db_conn, *args)
+        except sqlite3.OperationalError as error:
+            if not is_busy(error) or attempt == attempts - 1:
+                raise
+            if db_conn.in_transaction:
+                db_conn.rollback()
+        time.sleep(delay * 2 ** attempt)
+
+class Database:
+    """
+    Opens the connections to the Tech Trolley database, all with the same settings.
+
+    The database is switched to WAL journaling so several terminals can browse while another one
+    checks out, and every connection waits for locks instead of failing right away.
+
+    Attributes:
+    - path: Path of the SQLite database.
+    - timeout: Seconds a connection waits for a lock held by another connection.
+    """
+
+    def __init__(self, path, timeout=10.0):
+        """
+        Initialize the Database and enable WAL journaling, which is stored in the database file.
+
+        Parameters:
+        - path: Path of the SQLite database.
+        - timeout: Seconds a connection waits for a lock held by another connection.
+        """
+
+        self.path = path
+        self.timeout = timeout
+
+        db_conn = sqlite3.connect(self.path, timeout=self.timeout)
+        db_conn.execute("PRAGMA journal_mode = WAL")
+        db_conn.close()
+
+    def connect(self, read_only=False, **options):
+        """
+        Open a new connection.
+
+        Parameters:
+        - read_only: Whether the connection refuses to write, e.g. for the pooled read connections.
+        - options: Extra arguments passed to sqlite3.connect (e.g. isolation_level, check_same_thread).
+
+        Returns:
+        - sqlite3.Connection: The connection.
+        """
+
+        db_conn = sqlite3.connect(self.path, timeout=self.timeout, **options)
+        for pragma in PRAGMAS:
+            db_conn.execute(pragma)
+        if read_only:
+            db_conn.execute("PRAGMA query_only = ON")
+        return db_conn
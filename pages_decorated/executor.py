@@ -0,0 +1,204 @@
+import queue
+import threading
+from concurrent.futures import Future
+from database import retry
+
+class DatabaseExecutor:
+    """
+    Runs database work on background threads so the Tk main loop never waits for SQLite.
+
+    Writes run one after the other on a single writer thread, retried while another terminal holds
+    the database, and reads are shared by a pool of reader threads, so browsing never waits behind a
+    checkout. Every worker thread owns its own connection. Every submitted job returns a Future, and its
+    result is handed back to the main thread by polling with after(), where the on_done / on_error
+    callbacks run and may safely touch widgets. Jobs submitted with a key supersede the previous job
+    with the same key: a queued one is cancelled, a running one is interrupted, and a stale result is
+    never delivered.
+
+    Attributes:
+    - root: The Tk root widget used to schedule the callbacks.
+    - database: The Database the worker connections are opened on.
+    - readers: Number of reader threads.
+    - poll_interval: Milliseconds between two checks for finished jobs.
+    """
+
+    def __init__(self, root, database, readers=2, poll_interval=20):
+        """
+        Initialize the DatabaseExecutor and start its worker threads.
+
+        Parameters:
+        - root: The Tk root widget used to schedule the callbacks.
+        - database: The Database the worker connections are opened on.
+        - readers: Number of reader threads.
+        - poll_interval: Milliseconds between two checks for finished jobs.
+        """
+
+        self.root = root
+        self.database = database
+        self.readers = readers
+        self.poll_interval = poll_interval
+
+        # Jobs waiting for the writer and for the readers, and finished jobs waiting for the main thread
+        self.jobs = queue.Queue()
+        self.read_jobs = queue.Queue()
+        self.finished = queue.Queue()
+
+        # Only used on the main thread: callbacks of the pending jobs and the latest job of every key
+        self.callbacks = {}
+        self.latest = {}
+        self.poll_id = None
+
+        # The jobs currently running and the connection each one uses, shared with the workers
+        self.lock = threading.Lock()
+        self.running = {}
+
+        self.threads = [threading.Thread(target=self.work, args=(self.jobs, False), name="database-writer",
+                                         daemon=True)]
+        for n in range(readers):
+            self.threads.append(threading.Thread(target=self.work, args=(self.read_jobs, True),
+                                                 name=f"database-reader-{n}", daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, function, *args, on_done=None, on_error=None, key=None, read_only=False):
+        """
+        Queue a job for the worker threads.
+
+        Parameters:
+        - function: Function called as function(db_conn, *args) on a worker thread. It must not touch widgets.
+        - args: Extra arguments passed to the function.
+        - on_done: Function called on the main thread with the result.
+        - on_error: Function called on the main thread with the exception. Errors are reported through Tk if omitted.
+        - key: Name of the request, a newer job with the same key makes this one stale.
+        - read_only: Whether the job only reads, so it can run on a reader thread next to the writes.
+
+        Returns:
+        - Future: The future of the job.
+        """
+
+        if key is not None:
+            self.cancel(key)
+
+        future = Future()
+        self.callbacks[future] = (on_done, on_error, key)
+        if key is not None:
+            self.latest[key] = future
+        (self.read_jobs if read_only else self.jobs).put((future, function, args))
+
+        if self.poll_id is None:
+            self.poll_id = self.root.after(self.poll_interval, self.poll)
+        return future
+
+    def cancel(self, key):
+        """
+        Make the latest job with the given key stale, cancelling or interrupting it.
+
+        Parameters:
+        - key: Name of the request.
+        """
+
+        future = self.latest.pop(key, None)
+        if future is None or future.cancel():
+            return
+
+        # Already running: abort its statement so the worker moves on to the newer job
+        with self.lock:
+            connection = self.running.get(future)
+            if connection is not None:
+                connection.interrupt()
+
+    def work(self, jobs, read_only):
+        """
+        Run the queued jobs one after the other until shutdown.
+
+        Parameters:
+        - jobs: The queue the jobs are taken from.
+        - read_only: Whether the thread is a reader, with a connection that refuses to write.
+        """
+
+        connection = self.database.connect(read_only=read_only)
+
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            future, function, args = job
+
+            if future.set_running_or_notify_cancel():
+                with self.lock:
+                    self.running[future] = connection
+                try:
+                    if read_only:
+                        future.set_result(function(connection, *args))
+                    else:
+                        future.set_result(retry(function, connection, *args))
+                except BaseException as error:
+                    # Never leave a half-done transaction behind for the next job
+                    if connection.in_transaction:
+                        connection.rollback()
+                    future.set_exception(error)
+                finally:
+                    with self.lock:
+                        del self.running[future]
+            self.finished.put(future)
+
+        connection.close()
+
+    def poll(self):
+        """
+        Deliver the results of the finished jobs on the main thread.
+        """
+
+        self.poll_id = None
+        try:
+            while True:
+                try:
+                    future = self.finished.get_nowait()
+                except queue.Empty:
+                    break
+                self.deliver(future)
+        finally:
+            # Keep polling while jobs are pending (a callback may already have restarted it)
+            if self.callbacks and self.poll_id is None:
+                self.poll_id = self.root.after(self.poll_interval, self.poll)
+
+    def deliver(self, future):
+        """
+        Call the callback of a finished job, unless it was cancelled or became stale.
+
+        Parameters:
+        - future: The future of the finished job.
+        """
+
+        on_done, on_error, key = self.callbacks.pop(future)
+        if key is not None:
+            if self.latest.get(key) is not future:
+                return
+            del self.latest[key]
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is None:
+            if on_done:
+                on_done(future.result())
+        elif on_error:
+            on_error(error)
+        else:
+            self.root.report_callback_exception(type(error), error, error.__traceback__)
+
+    def shutdown(self):
+        """
+        Let the workers finish the queued jobs and stop them. Results that are still pending are dropped.
+        """
+
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+            self.poll_id = None
+        self.jobs.put(None)
+        for n in range(self.readers):
+            self.read_jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.callbacks.clear()
+        self.latest.clear()
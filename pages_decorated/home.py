@@ -1,8 +1,40 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox, font
-from datetime import datetime, timedelta
-from PIL import Image,ImageTk
+from datetime import datetime, timedelta, timezone
+from thumbnails import thumbnail_cache
+from page import Page
+from query_cache import QueryCache
+from cart_service import add_item
+
+def fts_phrase(text):
+    """
+    Quote text as an FTS5 phrase so that user input can't inject query syntax.
+
+    Parameters:
+    - text: The text to be quoted.
+
+    Returns:
+    - str: The quoted phrase.
+    """
+
+    return '"' + text.replace('"', '""') + '"'
+
+def search_match_expression(search_text):
+    """
+    Build the FTS5 MATCH expression for the search text.
+
+    Every search word is matched as a prefix, so "choc" finds "Snacks Chocolate".
+
+    Parameters:
+    - search_text: Text typed in the search bar.
+
+    Returns:
+    - str: The MATCH expression, or None if there is nothing to search for.
+    """
+
+    terms = [fts_phrase(word) + "*" for word in search_text.split()]
+    return " AND ".join(terms) if terms else None
 
 class Item:
     """
@@ -57,40 +89,114 @@ class Item:
         self.discount_amount = discount_amount
         self.egyptian_share = egyptian_share
 
+class StockSnapshot:
+    """
+    Shared view of the stock quantities of the items shown on the home page.
+
+    It is filled from the rows the page query already returned, so item frames never query the
+    database themselves, and refreshed with a single query for all tracked items when needed.
+
+    Attributes:
+    - db_conn: SQLite database connection.
+    - quantities: Dictionary mapping item IDs to their known stock quantity.
+    """
+
+    def __init__(self, db_conn):
+        """
+        Initializes a StockSnapshot.
+
+        Parameters:
+        - db_conn: SQLite database connection.
+        """
+
+        self.db_conn = db_conn
+        self.quantities = {}
+
+    def update(self, items):
+        """
+        Replace the snapshot with the stock quantities of the given items.
+
+        Parameters:
+        - items: List of Item objects returned by the page query.
+        """
+
+        self.quantities = {item.item_id: item.quantity_in_store for item in items}
+
+    def get(self, item_id):
+        """
+        Get the known stock quantity of an item.
+
+        Parameters:
+        - item_id: ID of the item.
+
+        Returns:
+        - int: The stock quantity, or 0 if the item isn't tracked.
+        """
+
+        return self.quantities.get(item_id, 0)
+
+    def take(self, item_id, quantity):
+        """
+        Record that some of an item's stock was moved to a cart.
+
+        Parameters:
+        - item_id: ID of the item.
+        - quantity: The quantity taken.
+        """
+
+        if item_id in self.quantities:
+            self.quantities[item_id] -= quantity
+
+    def refresh(self):
+        """
+        Reload the stock quantities of every tracked item with a single query.
+        """
+
+        if not self.quantities:
+            return
+        item_ids = list(self.quantities)
+        cursor = self.db_conn.cursor()
+        cursor.execute(f"SELECT item_id, quantity FROM items WHERE item_id IN ({', '.join('?' * len(item_ids))})",
+                       item_ids)
+        self.quantities.update(cursor.fetchall())
+
 class ItemFrame(tk.Frame):
     """
     Represents a frame displaying an item with controls to change quantity and add to the cart.
 
+    Item frames are pooled by the home page: the widgets are created once and show_item rebinds
+    them to a different item, so paging and filtering don't rebuild the grid.
+
     Attributes:
     - item: The Item object associated with the frame.
     - add_to_cart: Callback function to add the item to the cart.
+    - stock: StockSnapshot used to check the available quantity.
     """
 
-    def __init__(self, master, item, add_to_cart, *args, **kwargs):
+    # Fonts shared by every item frame, created with the first one
+    fonts = None
+
+    def __init__(self, master, add_to_cart, stock, *args, **kwargs):
         """
         Initializes an ItemFrame.
 
         Parameters:
         - master: The master widget.
-        - item: The Item object associated with the frame.
         - add_to_cart: Callback function to add the item to the cart.
+        - stock: StockSnapshot used to check the available quantity.
         """
 
         # Initialize ItemFrame
         super().__init__(master, *args, **kwargs)
         self.configure(bd=2, relief="groove")
-        self.item = item
+        self.item = None
         self.add_to_cart = add_to_cart
+        self.stock = stock
 
         # Configure grid layout
         for i in range(7):
             self.grid_rowconfigure(i, weight=1)
 
-        # Fetch stock quantity from the database
-        cursor = master.master.master.master.master.db_conn.cursor()
-        cursor.execute("SELECT quantity FROM items WHERE item_id = ?", (item.item_id,))
-        self.stock_quantity = cursor.fetchone()[0]
-
         # Create widgets for the ItemFrame
         self.create_widgets()
 
@@ -98,61 +204,54 @@ class ItemFrame(tk.Frame):
         """
         Create and configure the widgets for the item frame.
         """
-        self.bg = "#f8f8f8"
-        if self.item.egyptian_share == 100:
-            self.bg = "#32CD32"
-        self.configure(bg=self.bg)
 
         # Define the font styles
-        label_font = font.Font(family="Arial", size=12)
-        overstrike_font = font.Font(family="Arial", size=12, overstrike=True)
-        button_font = font.Font(family="Arial", size=12, weight="bold")
+        if ItemFrame.fonts is None:
+            ItemFrame.fonts = {
+                "label": font.Font(family="Arial", size=12),
+                "overstrike": font.Font(family="Arial", size=12, overstrike=True),
+                "button": font.Font(family="Arial", size=12, weight="bold"),
+            }
+        label_font = ItemFrame.fonts["label"]
+        button_font = ItemFrame.fonts["button"]
 
         #Item Image
-        self.item_image = (Image.open(f"images/{self.item.name}.png"))
-        self.item_image = self.item_image.resize((200,200), Image.LANCZOS)
-        self.item_image = ImageTk.PhotoImage(self.item_image)
-        self.item_image_label = tk.Label(self, image=self.item_image, bg=self.bg)
+        self.item_image = None
+        self.item_image_label = tk.Label(self)
         self.item_image_label.grid(row=0, column=0, columnspan=3, padx=10, pady=5, sticky="ew")
 
         # Item name label
-        self.item_name_label = tk.Label(self, text=self.item.name, font=label_font, bg=self.bg)
+        self.item_name_label = tk.Label(self, font=label_font)
         self.item_name_label.grid(row=1, column=0, columnspan=3, padx=10, pady=5, sticky="w")
         
         # Brand name label
-        self.brand_name_label = tk.Label(self, text=self.item.brand_name, font=label_font, bg=self.bg)
+        self.brand_name_label = tk.Label(self, font=label_font)
         self.brand_name_label.grid(row=2, column=0, columnspan=3, padx=10, sticky="w")
         
         # Original price label
-        self.item_ogprice_label = tk.Label(self, text=f"${self.item.original_price}", font=label_font, bg=self.bg)
+        self.item_ogprice_label = tk.Label(self, font=label_font)
         self.item_ogprice_label.grid(row=5, column=0, padx=10, sticky="w")
 
         # Discount percentage label
-        self.item_discount_label = tk.Label(self, text=f" ", fg="red", font=label_font, bg=self.bg)
+        self.item_discount_label = tk.Label(self, text=f" ", fg="red", font=label_font)
         self.item_discount_label.grid(row=4, column=0, padx=10, sticky="w")
         
-        # If item is on discount, display discount information
-        if self.item.discount:
-            # Discounted price label
-            self.item_newprice_label = tk.Label(self, text=f"${round(self.item.price, 2)}", font=label_font, bg=self.bg)
-            self.item_newprice_label.grid(row=5, column=2, padx=10, sticky="e")
-            self.item_discount_label.configure(text=f"{self.item.discount_amount}%")
-            # Apply strikethrough to original price label
-            self.item_ogprice_label.configure(font=overstrike_font)
+        # Discounted price label, only shown if the item is on discount
+        self.item_newprice_label = tk.Label(self, font=label_font)
+        self.item_newprice_label.grid(row=5, column=2, padx=10, sticky="e")
         
-        # Display a warning if the item quantity is low
-        if self.item.quantity_in_store < 5:
-            self.only_left_label = tk.Label(self, text=f"Only {self.item.quantity_in_store} left!", fg="red", font=label_font, bg=self.bg)
-            self.only_left_label.grid(row=4, column=2, padx=10, sticky="e")
+        # Warning label, only shown if the item quantity is low
+        self.only_left_label = tk.Label(self, fg="red", font=label_font)
+        self.only_left_label.grid(row=4, column=2, padx=10, sticky="e")
         
         # Sold and sold in the last 24 hours labels
-        self.sold_label = tk.Label(self, text=f"Sold: {self.item.sold}", font=label_font, bg=self.bg)
+        self.sold_label = tk.Label(self, font=label_font)
         self.sold_label.grid(row=3, column=0, padx=10, sticky="w")
-        self.sold24h_label = tk.Label(self, text=f"Sold in 24h: {self.item.sold_24h}", font=label_font, bg=self.bg)
+        self.sold24h_label = tk.Label(self, font=label_font)
         self.sold24h_label.grid(row=3, column=2, padx=10, sticky="e")
 
         # Quantity label
-        self.quantity_label = tk.Label(self, text=f"Quantity: {self.item.quantity}", font=label_font, bg=self.bg)
+        self.quantity_label = tk.Label(self, font=label_font)
         self.quantity_label.grid(row=6, column=1, padx=10)
 
         # Buttons to adjust quantity
@@ -162,17 +261,84 @@ class ItemFrame(tk.Frame):
         self.plus_button.grid(row=6, column=2, padx=10, sticky="e")
 
         # Button to add item to cart
-        self.add_button = tk.Button(self, text="Add to Cart", command=lambda item=self.item: self.add_to_cart(item), font=button_font)
+        self.add_button = tk.Button(self, text="Add to Cart", command=lambda: self.add_to_cart(self.item), font=button_font)
         self.add_button.grid(row=7, column=0, columnspan=3, padx=10, pady=5, sticky="ew")
 
+        self.labels = [self.item_image_label, self.item_name_label, self.brand_name_label, self.item_ogprice_label,
+                       self.item_discount_label, self.item_newprice_label, self.only_left_label, self.sold_label,
+                       self.sold24h_label, self.quantity_label]
+
+    def show_item(self, item):
+        """
+        Bind the frame to an item and update every widget to display it.
+
+        Parameters:
+        - item: The Item object to be displayed.
+        """
+
+        self.item = item
+
+        self.bg = "#f8f8f8"
+        if item.egyptian_share == 100:
+            self.bg = "#32CD32"
+        self.configure(bg=self.bg)
+        for label in self.labels:
+            label.configure(bg=self.bg)
+
+        self.item_image = thumbnail_cache.get(item.name, (200, 200))
+        self.item_image_label.configure(image=self.item_image)
+        self.item_name_label.configure(text=item.name)
+        self.brand_name_label.configure(text=item.brand_name)
+        self.item_ogprice_label.configure(text=f"${item.original_price}")
+        self.sold_label.configure(text=f"Sold: {item.sold}")
+        self.sold24h_label.configure(text=f"Sold in 24h: {item.sold_24h}")
+        self.quantity_label.configure(text=f"Quantity: {item.quantity}")
+
+        # If item is on discount, display discount information
+        if item.discount:
+            self.item_newprice_label.configure(text=f"${round(item.price, 2)}")
+            self.item_newprice_label.grid()
+            self.item_discount_label.configure(text=f"{item.discount_amount}%")
+            # Apply strikethrough to original price label
+            self.item_ogprice_label.configure(font=ItemFrame.fonts["overstrike"])
+        else:
+            self.item_newprice_label.grid_remove()
+            self.item_discount_label.configure(text=" ")
+            self.item_ogprice_label.configure(font=ItemFrame.fonts["label"])
+
+        # Display a warning if the item quantity is low
+        if item.quantity_in_store < 5:
+            self.only_left_label.configure(text=f"Only {item.quantity_in_store} left!")
+            self.only_left_label.grid()
+        else:
+            self.only_left_label.grid_remove()
+
+        # Show the cart controls again, they may have been hidden for the previous item
+        self.show_cart_controls(True)
+
+    def show_cart_controls(self, visible):
+        """
+        Show or hide the quantity and add to cart controls.
+
+        Parameters:
+        - visible: Whether the controls should be visible.
+        """
+
+        for widget in (self.quantity_label, self.minus_button, self.plus_button, self.add_button):
+            if visible:
+                widget.grid()
+            else:
+                widget.grid_remove()
 
     def increase_quantity(self):
         """
         Increase the quantity of the item in the frame.
         """
 
-        # Check if there is enough stock
-        if self.item.quantity < self.stock_quantity:
+        # Check if there is enough stock, refreshing the snapshot before giving up
+        if self.item.quantity >= self.stock.get(self.item.item_id):
+            self.stock.refresh()
+        if self.item.quantity < self.stock.get(self.item.item_id):
             self.item.quantity += 1
             self.quantity_label.config(text=f"Quantity: {self.item.quantity}")
         else:
@@ -188,7 +354,167 @@ class ItemFrame(tk.Frame):
             self.item.quantity -= 1
             self.quantity_label.config(text=f"Quantity: {self.item.quantity}")
 
-class HomePage(tk.Frame):
+# Sales in the last 24 hours and active discount per item, aggregated once and joined by the item
+# queries instead of running a subquery for every output row. Lifetime sales and the Egyptian share
+# are read from item_sales and brand_attributes directly. Binds the start of the hour one day ago, now and now.
+ITEM_STATS = """
+    WITH item_sold_24h AS (
+        SELECT item_id, SUM(sold) AS sold_24h
+        FROM item_sales_hourly
+        WHERE hour >= ?
+        GROUP BY item_id
+    ),
+    active_discounts AS (
+        SELECT item_id, discount_amount, MIN(discount_id)
+        FROM discounts
+        WHERE start_date <= ? AND end_date >= ?
+        GROUP BY item_id
+    )
+"""
+
+def item_stats_values(current_time=None):
+    """
+    Build the values bound to ITEM_STATS.
+
+    Sales are counted per hour, so the last 24 hours start with the hour one day ago. Discount windows
+    are stored as dates, so they are compared with today's date (a window is still active on its last
+    day, as in refresh_discounts). Both are in UTC, like SQLite's 'now' used for the payment dates the
+    hourly sales are keyed by and for the discount windows in refresh_discounts, so the page, the
+    payments and the maintenance agree on every terminal.
+
+    Parameters:
+    - current_time: The UTC datetime the values are computed for (now if omitted).
+
+    Returns:
+    - tuple: The start of the hour one day ago, today and today.
+    """
+
+    current_time = current_time if current_time else datetime.now(timezone.utc)
+    one_day_ago = current_time - timedelta(days=1)
+    today = current_time.date().isoformat()
+    return (one_day_ago.strftime("%Y-%m-%d %H:00:00"), today, today)
+
+def item_from_row(row):
+    """
+    Build an Item from a row of an item query.
+
+    Parameters:
+    - row: Tuple containing the item ID, name, stock quantity, price, brand name, brand nationality,
+      units sold, units sold in the last 24 hours, discount amount and Egyptian share.
+
+    Returns:
+    - Item: The item.
+    """
+
+    item_id, item_name, item_quantity, item_price, brand_name, \
+    brand_nationality, sold, sold_24h, discount, egyptian_share = row[:10]
+    sold_24h = sold_24h if sold_24h else 0
+    if discount:
+        discount_price = item_price * (1 - (discount / 100))
+    else:
+        discount_price = item_price
+    return Item(item_id, item_name, brand_name, brand_nationality, item_price, discount_price, sold, sold_24h, 
+                item_quantity, discount, egyptian_share)
+
+def item_query(filters, page_cursor, limit, current_time=None):
+    """
+    Build the query fetching a page of items.
+
+    Parameters:
+    - filters: Tuple built by HomePage.normalized_filters.
+    - page_cursor: The (sort key, item ID) of the last row of the previous page, or None for the first page.
+    - limit: Number of items on a page.
+    - current_time: The datetime recent sales and active discounts are computed for (now if omitted).
+
+    Returns:
+    - tuple: The query, fetching one row more than the page size, and the values bound to it.
+    """
+
+    brand_name_filter, brand_nationality_filter, category_filter, min_price_filter, max_price_filter, \
+    on_discount_filter, search_filter = filters
+
+    # Search goes through the full-text index and its results are ranked by relevance
+    match_expression = search_match_expression(search_filter) if search_filter else None
+    sort_key = "f.rank" if match_expression else "i.item_id"
+    search_join = "JOIN items_fts AS f ON f.rowid = i.item_id" if match_expression else ""
+
+    query = ITEM_STATS + """
+        SELECT i.item_id, i.name, i.quantity, i.price, b.name, b.nationality,
+        s.sold, s24.sold_24h, d.discount_amount, e.egyptian_share, {sort_key} AS sort_key
+        FROM items i
+        JOIN brands b ON i.brand_id = b.brand_id
+        {search_join}
+        LEFT JOIN item_sales AS s ON s.item_id = i.item_id
+        LEFT JOIN item_sold_24h AS s24 ON s24.item_id = i.item_id
+        LEFT JOIN active_discounts AS d ON d.item_id = i.item_id
+        LEFT JOIN brand_attributes AS e ON e.brand_id = i.brand_id
+    """.format(sort_key=sort_key, search_join=search_join)
+    values = item_stats_values(current_time)
+
+    # Only show items that are in stock
+    filters = ["i.quantity > 0"]
+
+    if brand_name_filter:
+        filters.append("b.name = ?")
+        values += (brand_name_filter,)
+
+    if brand_nationality_filter:
+        filters.append("b.nationality = ?")
+        values += (brand_nationality_filter,)
+    
+    if category_filter:
+        filters.append("i.category_id = ?")
+        values += (category_filter,)
+
+    if match_expression:
+        filters.append("items_fts MATCH ?")
+        values += (match_expression,)
+
+    if min_price_filter:
+        filters.append("i.price >= ?")
+        values += (min_price_filter,)
+
+    if max_price_filter:
+        filters.append("i.price <= ?")
+        values += (max_price_filter,)
+
+    if on_discount_filter:
+        filters.append("i.item_id IN (SELECT item_id FROM discounts)")
+
+    # Seek past the last row of the previous page instead of skipping rows with OFFSET
+    if page_cursor:
+        filters.append(f"({sort_key}, i.item_id) > (?, ?)")
+        values += page_cursor
+
+    query += " WHERE " + " AND ".join(filters)
+    
+    # Fetch one extra row to know whether there is a next page
+    query += " ORDER BY sort_key, i.item_id LIMIT ?"
+    values += (limit + 1,)
+    return query, values
+
+def load_items(db_conn, filters, page_cursor, limit, current_time=None):
+    """
+    Fetch a page of items from the database. Runs on the database executor.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - filters: Tuple built by HomePage.normalized_filters.
+    - page_cursor: The (sort key, item ID) of the last row of the previous page, or None for the first page.
+    - limit: Number of items on a page.
+    - current_time: The datetime recent sales and active discounts are computed for (now if omitted).
+
+    Returns:
+    - tuple: List of item rows (see item_from_row) and the cursor of the next page (None on the last page).
+    """
+
+    cursor = db_conn.cursor()
+    cursor.execute(*item_query(filters, page_cursor, limit, current_time))
+    rows = cursor.fetchall()
+    next_cursor = (rows[limit - 1][-1], rows[limit - 1][0]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+class HomePage(Page):
     """
     Represents the home page of the Tech Trolley application.
 
@@ -196,13 +522,14 @@ class HomePage(tk.Frame):
     - switch_to_cart_callback: Callback function to switch to the cart page.
     - switch_to_admin_callback: Callback function to switch to the admin page.
     - db_conn: SQLite database connection.
-    - cart_id: ID of the current shopping cart.
-    - customer_email: Email address of the customer.
-    - admin: Boolean indicating if the user is an admin.
+    - executor: DatabaseExecutor running the item queries in the background.
+    - catalog: CatalogSnapshot answering the item queries from memory when enabled.
+    - session: The current Session.
+    - ids: IdAllocator giving new carts their ID.
     """
 
     def __init__(self, master, switch_to_cart_callback, switch_to_admin_callback, switch_to_login_callback, db_conn,
-                 admin, customer_email, cart_id):
+                 executor, catalog, session, ids):
         """
         Initializes the HomePage.
 
@@ -211,9 +538,10 @@ class HomePage(tk.Frame):
         - switch_to_cart_callback: Callback function to switch to the cart page.
         - switch_to_admin_callback: Callback function to switch to the admin page.
         - db_conn: SQLite database connection.
-        - admin: Boolean indicating if the user is an admin.
-        - customer_email: Email address of the customer.
-        - cart_id: ID of the current shopping cart.
+        - executor: DatabaseExecutor running the item queries in the background.
+        - catalog: CatalogSnapshot answering the item queries from memory when enabled.
+        - session: The current Session.
+        - ids: IdAllocator giving new carts their ID.
         """
 
         # Initialize HomePage
@@ -222,12 +550,31 @@ class HomePage(tk.Frame):
         self.switch_to_admin_callback = switch_to_admin_callback
         self.switch_to_login_callback = switch_to_login_callback
         self.db_conn = db_conn
-        self.admin = admin
-        self.customer_email = customer_email
-        self.cart_id = cart_id
+        self.executor = executor
+        self.catalog = catalog
+        self.session = session
+        self.ids = ids
+
+        # Email of the user the filters were last set up for
+        self.shown_email = None
 
+        # Keyset pagination: page_cursors[n] is the (sort key, item_id) of the last row shown before page n + 1
         self.current_page = 1
         self.items_per_page = 50
+        self.page_cursors = [None]
+        self.next_cursor = None
+
+        # Filter changes are debounced: the items are only fetched once the filters have been left alone
+        # for filter_delay milliseconds, and only if they differ from the filters last fetched
+        self.filter_delay = 300
+        self.filter_after_id = None
+        self.applied_filters = None
+
+        # Pages already fetched, keyed by filters and cursor, so flipping back to them doesn't query again
+        self.results = QueryCache()
+
+        # Stock of the items on the current page, shared by the item frames
+        self.stock = StockSnapshot(self.db_conn)
 
         # Configure grid layout
         self.grid_rowconfigure(2, weight=1)
@@ -256,12 +603,10 @@ class HomePage(tk.Frame):
         self.button_home = tk.Button(self.home_frame, text="Home", font=button_font)
         self.button_home.pack(side="left", padx=5, pady=5)
 
-        # Create admin button and configure its visibility
+        # Create admin button, only shown to admins
         self.button_admin = tk.Button(self, text="Admin Page", command=self.switch_to_admin_callback, font=button_font)
-        if self.admin:
-            self.button_admin.grid(row=0, column=1, sticky="n", pady=10)
-        else:
-            self.button_admin.grid_remove()
+        self.button_admin.grid(row=0, column=1, sticky="n", pady=10)
+        self.button_admin.grid_remove()
 
         # Market name label
         self.label_tech_trolley = tk.Label(self, text="Tech Trolley", font=title_font, bg="#d9f4ff")
@@ -275,15 +620,10 @@ class HomePage(tk.Frame):
         self.button_cart = tk.Button(self.cart_frame, image=self.cart_image, compound="bottom", 
                                      command=self.switch_to_cart_callback, font=button_font)
         self.button_cart.pack(side="right", padx=5, pady=5)
-        
-        # Update cart button text based on the number of items in the cart
-        self.num_cart_items = 0
-        cursor = self.db_conn.cursor()
-        if self.cart_id:
-            cursor.execute("SELECT COUNT(*) FROM cart_item WHERE cart_id = ?", (self.cart_id,))
-            self.num_cart_items = cursor.fetchone()[0]
-        
-        self.button_cart.configure(text=self.num_cart_items)
+
+        # Keep the cart badge in sync with the session
+        self.button_cart.configure(text=self.session.num_cart_items)
+        self.session.subscribe("num_cart_items", self.update_cart_badge)
 
         # Create center frame for search, items, and filters
         self.center_frame = tk.Frame(self, bg="#d9f4ff")
@@ -310,6 +650,8 @@ class HomePage(tk.Frame):
         self.search_var = tk.StringVar()
         self.search_bar = tk.Entry(self.search_frame, textvariable=self.search_var, bg="#f8f8f8", font=entry_font)
         self.search_bar.pack(side="left", expand=True, fill="x", padx=10, pady=10, ipadx=5, ipady=5)
+        self.search_bar.bind("<Return>", self.apply_filters)
+        self.search_var.trace_add("write", lambda *args: self.schedule_filters())
         self.search_button = tk.Button(self.search_frame, text="Search", command=self.on_search_clicked, font=button_font)
         self.search_button.pack(side="right", padx=10, pady=10)
 
@@ -324,8 +666,6 @@ class HomePage(tk.Frame):
         
         self.items_frame = tk.Frame(self.center_canvas, bg="#ffffff")
         self.items_frame_window_id = self.center_canvas.create_window((0, 0), window=self.items_frame, anchor="nw")
-        self.center_canvas.bind_all("<MouseWheel>", 
-                                    lambda event: self.center_canvas.yview_scroll(-1 * (event.delta // 120), "units"))
         
         self.item_frames = []
         self.shop_items = []
@@ -340,61 +680,38 @@ class HomePage(tk.Frame):
         self.filter_label.grid(row=0, column=0, padx=10, pady=20)
 
         # Brand Name filter
-        cursor = self.db_conn.cursor()
         self.brand_name_var = tk.StringVar()
         self.brand_name_combo = ttk.Combobox(self.filter_frame, textvariable=self.brand_name_var, font=entry_font)
-        cursor.execute("SELECT DISTINCT name FROM brands")
-        brands = cursor.fetchall()
-        for n, i in enumerate(brands):
-                brands[n] = i[0]
-        self.brand_name_combo["values"] = ["Select Brand"] + brands
         self.brand_name_combo.grid(row=1, column=0, padx=10, pady=10)
-        self.brand_name_combo.set("Select Brand")
         self.brand_name_combo.bind("<<ComboboxSelected>>", self.on_brand_name_changed)
 
         # Brand Nationality filter
         self.brand_nationality_var = tk.StringVar()
         self.brand_nationality_combo = ttk.Combobox(self.filter_frame, textvariable=self.brand_nationality_var, font=entry_font)
-        cursor.execute("SELECT DISTINCT nationality FROM brands")
-        nationalities = cursor.fetchall()
-        for n, i in enumerate(nationalities):
-                nationalities[n] = i[0]
-        self.brand_nationality_combo["values"] = ["Select Nationality"] + nationalities
         self.brand_nationality_combo.grid(row=2, column=0, padx=10, pady=10)
-        self.brand_nationality_combo.set("Select Nationality")
         self.brand_nationality_combo.bind("<<ComboboxSelected>>", self.on_brand_nationality_changed)
 
         # Category filter
         self.category_var = tk.StringVar()
         self.category_combo = ttk.Combobox(self.filter_frame, textvariable=self.category_var, font=entry_font)
-        categories = ["Dairy", "Bakery", "Beverages", "Snacks", "Meat", "Seafood", "Produce", "Canned Goods", 
-                      "Frozen Food", "Personal Care"]
-        self.category_combo["values"] = ["Select Category"] + categories
         self.category_combo.grid(row=3, column=0, padx=10, pady=10)
-        self.category_combo.set("Select Category")
         self.category_combo.bind("<<ComboboxSelected>>", self.on_category_changed)
 
         # Price filters
-        cursor.execute("SELECT MAX(price), MIN(price) FROM items")
-        max_price, min_price = cursor.fetchone()
-        
         self.min_price_label = tk.Label(self.filter_frame, text="Min Price", font=label_font, bg="#ffffff")
         self.min_price_label.grid(row=4, column=0, padx=10, pady=10)
-        self.min_price = tk.Scale(self.filter_frame, from_=min_price, to=max_price, orient=tk.HORIZONTAL, font=label_font, 
+        self.min_price = tk.Scale(self.filter_frame, orient=tk.HORIZONTAL, font=label_font, 
                                   command=self.update_max_price, bd=2, relief="groove")
         self.min_price.bind("<ButtonRelease-1>", self.button_release)
         self.min_price.grid(row=5, column=0, padx=10, pady=10, sticky="ew")
 
         self.max_price_label = tk.Label(self.filter_frame, text="Max Price", font=label_font, bg="#ffffff")
         self.max_price_label.grid(row=6, column=0, padx=10, pady=10)
-        self.max_price = tk.Scale(self.filter_frame, from_=min_price, to=max_price, orient=tk.HORIZONTAL, font=label_font, 
+        self.max_price = tk.Scale(self.filter_frame, orient=tk.HORIZONTAL, font=label_font, 
                                   command=self.update_min_price, bd=2, relief="groove")
         self.max_price.bind("<ButtonRelease-1>", self.button_release)
         self.max_price.grid(row=7, column=0, padx=10, pady=10, sticky="ew")
 
-        self.min_price.set(min_price)
-        self.max_price.set(max_price)
-
         # Discount filter
         self.discount_check_var = tk.IntVar() 
         self.on_discount_check = tk.Checkbutton(self.filter_frame, text="On discount", variable=self.discount_check_var, 
@@ -422,21 +739,171 @@ class HomePage(tk.Frame):
         self.logout_button = tk.Button(self.logout_frame, text="Log Out", font=button_font, command=self.log_out)
         self.logout_button.grid(row=1, column=0, columnspan=3, sticky="sew")
 
+        # Fill the filters with the brands, nationalities, categories and price range in the store
+        self.load_filter_options()
+        self.reset_filters()
+
+        self.center_canvas.bind("<Configure>", lambda e: self.on_canvas_configure(e.width))
+
+    def load_filter_options(self):
+        """
+        Load the values offered by the filter widgets from the database.
+        """
+
+        cursor = self.db_conn.cursor()
+
+        cursor.execute("SELECT DISTINCT name FROM brands")
+        brands = [i[0] for i in cursor.fetchall()]
+        self.brand_name_combo["values"] = ["Select Brand"] + brands
+
+        cursor.execute("SELECT DISTINCT nationality FROM brands")
+        nationalities = [i[0] for i in cursor.fetchall()]
+        self.brand_nationality_combo["values"] = ["Select Nationality"] + nationalities
+
+        cursor.execute("SELECT category_id, name FROM categories ORDER BY name")
+        self.categories = {name: category_id for category_id, name in cursor.fetchall()}
+        self.category_combo["values"] = ["Select Category"] + list(self.categories)
+
+        cursor.execute("SELECT MAX(price), MIN(price) FROM items")
+        self.max_price_value, self.min_price_value = cursor.fetchone()
+        self.min_price.configure(from_=self.min_price_value, to=self.max_price_value)
+        self.max_price.configure(from_=self.min_price_value, to=self.max_price_value)
+
+    def reset_filters(self):
+        """
+        Set every filter back to its default value and go back to the first page.
+        """
+
+        self.search_var.set("")
+        self.brand_name_combo.set("Select Brand")
+        self.brand_nationality_combo.set("Select Nationality")
+        self.category_combo.set("Select Category")
+        self.min_price.set(self.min_price_value)
+        self.max_price.set(self.max_price_value)
+        self.discount_check_var.set(0)
+        self.reset_pages()
+
+    def on_show(self, state):
+        """
+        Refresh the home page for the current user and cart before it is shown.
+
+        Filters and the current page are kept while the same user navigates around the application.
+
+        Parameters:
+        - state: The current Session.
+        """
+
+        user_changed = state.email != self.shown_email
+        self.shown_email = state.email
+
+        if state.admin:
+            self.button_admin.grid()
+            # Admins may have added items or brands
+            self.load_filter_options()
+        else:
+            self.button_admin.grid_remove()
+
+        if user_changed:
+            self.reset_filters()
+
+        self.center_canvas.bind_all("<MouseWheel>", 
+                                    lambda event: self.center_canvas.yview_scroll(-1 * (event.delta // 120), "units"))
+
         # Fetch and display items
         self.fetch_items()
 
-        # Update visibility of add to cart buttons based on cart contents
-        self.add_to_cart_button_visibilty()
+    def on_hide(self):
+        """
+        Drop a pending filter change when the page is hidden.
+        """
 
-        self.center_canvas.bind("<Configure>", lambda e: self.on_canvas_configure(e.width))
+        self.cancel_filters()
+
+    def update_cart_badge(self, num_cart_items):
+        """
+        Show the number of items in the cart on the cart button.
+
+        Parameters:
+        - num_cart_items: Number of items in the cart.
+        """
+
+        self.button_cart.configure(text=num_cart_items)
+
+    def teardown(self):
+        """
+        Stop following the session and destroy the page.
+        """
+
+        self.session.unsubscribe("num_cart_items", self.update_cart_badge)
+        self.cancel_filters()
+        super().teardown()
+
+    def current_filters(self):
+        """
+        Read the values of the filter widgets.
+
+        Returns:
+        - tuple: The brand name, brand nationality, category, minimum price, maximum price, on discount flag and search text.
+        """
+
+        return (self.brand_name_var.get(), self.brand_nationality_var.get(), self.category_var.get(),
+                self.min_price.get(), self.max_price.get(), self.discount_check_var.get(), self.search_var.get())
+
+    def schedule_filters(self, event=None):
+        """
+        Apply the filters once they have been left alone for filter_delay milliseconds.
+
+        Every call restarts the delay, so a burst of changes (typing, dragging a price slider, flipping
+        through a combobox) ends up in a single query. Changes made while the page is hidden (building
+        it, or resetting the filters in on_show) are ignored, on_show fetches the items itself.
+
+        Parameters:
+        - event: Event object (default is None).
+        """
+
+        self.cancel_filters()
+        if not self.winfo_manager():
+            return
+        self.filter_after_id = self.after(self.filter_delay, self.apply_filters)
+
+    def cancel_filters(self):
+        """
+        Cancel a scheduled filter change.
+        """
+
+        if self.filter_after_id is not None:
+            self.after_cancel(self.filter_after_id)
+            self.filter_after_id = None
+
+    def apply_filters(self, event=None):
+        """
+        Fetch the first page for the current filters, unless they are the ones already shown.
+
+        Parameters:
+        - event: Event object (default is None).
+        """
+
+        self.cancel_filters()
+        if self.current_filters() == self.applied_filters:
+            return
+        self.reset_pages()
+        self.fetch_items()
 
     def button_release(self, event):
         """
         Update items on button release of price filter.
         """
 
+        self.schedule_filters()
+
+    def reset_pages(self):
+        """
+        Go back to the first page and forget the page cursors, e.g. after a filter change.
+        """
+
         self.current_page = 1
-        self.fetch_items()
+        self.page_cursors = [None]
+        self.next_cursor = None
 
     def on_canvas_configure(self, canvas_width):
         """
@@ -458,30 +925,33 @@ class HomePage(tk.Frame):
         Switch to the previous page and update the items.
         """
 
+        # Filters changed since the last fetch start over from the first page
+        if self.current_filters() != self.applied_filters:
+            self.apply_filters()
+            return
+
         if self.current_page > 1:
             self.current_page -= 1
             self.fetch_items()
-            self.next_page_button.config(state="normal")
-
-        # Disable previous page button when on the first page
-        if self.current_page == 1:
-            self.prev_page_button.config(state="disabled")
 
     def switch_to_next_page(self):
         """
         Switch to the next page and update the items.
         """
-        self.current_page += 1
-        self.fetch_items()
 
-        # Check if there are items on the next page
-        if len(self.shop_items) < self.items_per_page:
-            self.next_page_button.config(state="disabled")
-        else:
-            self.next_page_button.config(state="normal")
+        # Filters changed since the last fetch start over from the first page
+        if self.current_filters() != self.applied_filters:
+            self.apply_filters()
+            return
 
-        # Enable previous page button
-        self.prev_page_button.config(state="normal")
+        if self.next_cursor is None:
+            return
+
+        # Remember where the next page starts so it can be revisited
+        del self.page_cursors[self.current_page:]
+        self.page_cursors.append(self.next_cursor)
+        self.current_page += 1
+        self.fetch_items()
 
     def update_min_price(self, val):
         """
@@ -495,6 +965,7 @@ class HomePage(tk.Frame):
         max_val = int(val)
         if max_val < min_val:
             self.min_price.set(max_val)
+        self.schedule_filters()
 
     def update_max_price(self, val):
         """
@@ -508,6 +979,7 @@ class HomePage(tk.Frame):
         min_val = int(val)
         if min_val > max_val:
             self.max_price.set(min_val)
+        self.schedule_filters()
     
     def on_brand_name_changed(self, event=None):
         """
@@ -517,8 +989,7 @@ class HomePage(tk.Frame):
         - event: Event object (default is None).
         """
 
-        self.current_page = 1
-        self.fetch_items()
+        self.schedule_filters()
 
     def on_brand_nationality_changed(self, event=None):
         """
@@ -528,8 +999,7 @@ class HomePage(tk.Frame):
         - event: Event object (default is None).
         """
 
-        self.current_page = 1
-        self.fetch_items()
+        self.schedule_filters()
 
     def on_category_changed(self, event=None):
         """
@@ -539,39 +1009,41 @@ class HomePage(tk.Frame):
         - event: Event object (default is None).
         """
 
-        self.current_page = 1
-        self.fetch_items()
+        self.schedule_filters()
 
     def on_discount_checked(self):
         """
         Callback function for on discount filter change.
         """
 
-        self.current_page = 1
-        self.fetch_items()
+        self.schedule_filters()
     
     def on_search_clicked(self):
         """
         Callback function for search button click.
         """
 
-        self.current_page = 1
-        self.fetch_items()
+        self.apply_filters()
 
     def display_items(self):
         """
         Display items on the home page.
         """
 
-        for i in self.item_frames:
-            i.destroy()
-        self.item_frames = []
+        # Reuse the pooled item frames, only creating new ones when the page has more items than before
         for i, item in enumerate(self.shop_items):
-            row = i // 4
-            column = i % 4
-            frame = ItemFrame(self.items_frame, item, self.add_to_cart)
-            frame.grid(row=row, column=column, padx=5, pady=5, sticky="ew")
-            self.item_frames.append(frame)
+            if i == len(self.item_frames):
+                row = i // 4
+                column = i % 4
+                frame = ItemFrame(self.items_frame, self.add_to_cart, self.stock)
+                frame.grid(row=row, column=column, padx=5, pady=5, sticky="ew")
+                self.item_frames.append(frame)
+            self.item_frames[i].show_item(item)
+            self.item_frames[i].grid()
+
+        # Hide the frames that aren't needed for this page
+        for frame in self.item_frames[len(self.shop_items):]:
+            frame.grid_remove()
         
         self.items_frame.update_idletasks()
         self.on_canvas_configure(self.center_canvas.winfo_width())
@@ -579,84 +1051,82 @@ class HomePage(tk.Frame):
     def fetch_items(self):
         """
         Fetch items based on selected filters and current page.
+
+        Recently fetched pages are served from the result cache. Otherwise the items are filtered in
+        memory when the catalog snapshot is enabled, and queried from the database if not. Either way
+        the work runs on the database executor and the items are shown by show_fetched_items once it
+        finishes; a newer fetch supersedes one that is still running.
         """
 
-        offset = (self.current_page - 1) * self.items_per_page
         limit = self.items_per_page
+        page_cursor = self.page_cursors[self.current_page - 1]
+
+        # Remember which filters are shown, so applying them again is a no-op
+        self.applied_filters = self.current_filters()
+        filters = self.normalized_filters(self.applied_filters)
+
+        # Serve a page seen recently, as long as nothing was written to the catalog since
+        key = (filters, page_cursor, limit)
+        version = self.catalog.version
+        result = self.results.get(key, version)
+        if result is not None:
+            self.executor.cancel("home items")
+            self.show_fetched_items(result)
+            return
+
+        # Until the new page arrives there is no known next page
+        self.next_cursor = None
+        self.next_page_button.config(state="disabled")
+
+        load = self.catalog.query if self.catalog.enabled else load_items
+        self.executor.submit(load, filters, page_cursor, limit, key="home items", read_only=True,
+                             on_done=lambda result: self.fetched_items(key, version, result))
+
+    def fetched_items(self, key, version, result):
+        """
+        Cache the result of a finished fetch and show its items.
 
-        self.shop_items = []
-        current_time = datetime.now()
-        one_day_ago = current_time - timedelta(days=1)
-        cursor = self.db_conn.cursor()
+        Parameters:
+        - key: The filters, cursor and page size of the fetch.
+        - version: The catalog version when the fetch was submitted.
+        - result: Tuple containing the item rows and the cursor of the next page (None on the last page).
+        """
 
-        brand_name_filter = self.brand_name_var.get()
-        brand_nationality_filter = self.brand_nationality_var.get()
-        category_filter = self.category_var.get()
-        min_price_filter = self.min_price.get()
-        max_price_filter = self.max_price.get()
-        on_discount_filter = self.discount_check_var.get()
-        search_filter = self.search_var.get()
-
-        query = """
-            SELECT i.item_id, i.name, i.quantity, i.price, b.name, b.nationality,
-            (SELECT SUM(quantity) FROM cart_item WHERE item_id = i.item_id) AS sold,
-            (SELECT SUM(quantity) FROM cart_item AS ci JOIN payments AS p ON ci.cart_id = p.cart_id WHERE p.payment_date >= ?)
-            AS sold_24h,
-            (SELECT discount_amount FROM discounts WHERE item_id = i.item_id AND start_date <= ? AND end_date >= ?) AS discount,
-            (SELECT SUM(share) FROM stakeholders WHERE nationality = 'Egyptian' AND brand_id = i.brand_id GROUP BY brand_id) AS egyptian_share
-            FROM items i
-            JOIN brands b ON i.brand_id = b.brand_id
-        """
-        values = (one_day_ago, current_time, current_time)
-        filters = []
-
-        if brand_name_filter and brand_name_filter != "Select Brand":
-            filters.append("b.name = ?")
-            values += (brand_name_filter,)
-
-        if brand_nationality_filter and brand_nationality_filter != "Select Nationality":
-            filters.append("b.nationality = ?")
-            values += (brand_nationality_filter,)
-        
-        if category_filter and category_filter != "Select Category":
-            filters.append("i.name LIKE ?")
-            values += (f"%{category_filter}%",)
+        self.results.put(key, version, result)
+        self.show_fetched_items(result)
 
-        if min_price_filter:
-            filters.append("i.price >= ?")
-            values += (min_price_filter,)
+    def normalized_filters(self, filters):
+        """
+        Turn the values of the filter widgets into the filters of an item query.
 
-        if max_price_filter:
-            filters.append("i.price <= ?")
-            values += (max_price_filter,)
+        Parameters:
+        - filters: Tuple returned by current_filters.
 
-        if on_discount_filter:
-            filters.append("i.item_id IN (SELECT item_id FROM discounts)")
+        Returns:
+        - tuple: The brand name, brand nationality, category ID, minimum price, maximum price, on discount flag
+          and search text, with None for the filters that are not set.
+        """
 
-        if search_filter:
-            filters.append("(i.name LIKE ? OR b.name LIKE ?)")
-            values += (f"%{search_filter}%", f"%{search_filter}%")
+        brand_name, brand_nationality, category, min_price, max_price, on_discount, search_text = filters
+        return (brand_name if brand_name and brand_name != "Select Brand" else None,
+                brand_nationality if brand_nationality and brand_nationality != "Select Nationality" else None,
+                self.categories.get(category) if category and category != "Select Category" else None,
+                min_price if min_price else None,
+                max_price if max_price else None,
+                bool(on_discount),
+                search_text.strip() if search_text.strip() else None)
 
-        if filters:
-            query += " WHERE " + " AND ".join(filters)
-        
-        query += " LIMIT ? OFFSET ?"
-        values += (limit, offset)
-        
-        cursor.execute(query, values)
-
-        for row in cursor.fetchall():
-            item_id, item_name, item_quantity, item_price, brand_name, \
-            brand_nationality, sold, sold_24h, discount, egyptian_share = row
-            sold_24h = sold_24h if sold_24h else 0
-            if discount:
-                discount_price = item_price * (1 - (discount / 100))
-            else:
-                discount_price = item_price
-            if item_quantity > 0:
-                item = Item(item_id, item_name, brand_name, brand_nationality, item_price, discount_price, sold, sold_24h, 
-                            item_quantity, discount, egyptian_share)
-                self.shop_items.append(item)
+    def show_fetched_items(self, result):
+        """
+        Show the items of a finished fetch.
+
+        Parameters:
+        - result: Tuple containing the item rows and the cursor of the next page (None on the last page).
+        """
+
+        rows, self.next_cursor = result
+        self.shop_items = [item_from_row(row) for row in rows]
+        self.stock.update(self.shop_items)
 
         # Disable previous page button when on the first page
         if self.current_page == 1:
@@ -665,12 +1135,15 @@ class HomePage(tk.Frame):
             self.prev_page_button.config(state="normal")
 
         # Check if there are items on the next page
-        if len(self.shop_items) < self.items_per_page:
+        if self.next_cursor is None:
             self.next_page_button.config(state="disabled")
         else:
             self.next_page_button.config(state="normal")
 
         self.display_items()
+
+        # Update visibility of add to cart buttons based on cart contents
+        self.add_to_cart_button_visibilty()
     
     def add_to_cart(self, item):
         """
@@ -680,55 +1153,61 @@ class HomePage(tk.Frame):
         - item: The selected Item object.
         """
         if item.quantity > 0:
-            cursor = self.db_conn.cursor()
-            if not self.cart_id:
-                cursor.execute("SELECT cart_id FROM shopping_carts ORDER BY cart_id DESC LIMIT 1")
-                result = cursor.fetchone()
-                self.cart_id = int(result[0]) + 1
-                self.master.cart_id = self.cart_id
-                cursor.execute("INSERT INTO shopping_carts (cart_id, customer_email, creation_time) VALUES (?, ?, ?)", 
-                                    (self.cart_id, self.customer_email, datetime.now()))
-                self.db_conn.commit()
-            
-            cursor.execute("INSERT INTO cart_item (cart_id, item_id, quantity) VALUES (?, ?, ?)", (self.cart_id, item.item_id, item.quantity))
-            self.db_conn.commit()
-            cursor.execute("UPDATE items SET quantity = quantity - ? WHERE item_id = ?", (item.quantity, item.item_id))
-            self.db_conn.commit()
-            cursor.execute("SELECT COUNT(*) FROM cart_item WHERE cart_id = ?", (self.cart_id,))
-            self.num_cart_items = cursor.fetchone()[0]
-            self.button_cart.configure(text=self.num_cart_items)
-            self.add_to_cart_button_visibilty()
-            messagebox.showinfo("Cart", f"Added {item.quantity} of {item.name} to the cart.")
+            # Reserve the cart ID right away, so items added before the first one is stored share the cart
+            if not self.session.cart_id:
+                self.session.update(cart_id=self.ids.next_id("shopping_carts"))
+
+            # The cart (if needed), the line and the stock are written in one transaction on the executor
+            quantity = item.quantity
+            self.executor.submit(add_item, self.session.cart_id, self.session.email, item.item_id, quantity,
+                                 on_done=lambda result: self.item_added(item, quantity, result))
         
         else:
             messagebox.showerror("Cart", "No quantity selected")
 
+    def item_added(self, item, quantity, result):
+        """
+        Update the page after an item was added to the cart.
+
+        Parameters:
+        - item: The added Item object.
+        - quantity: The quantity added.
+        - result: Tuple containing a boolean indicating if the item was added, the line of the item, the 
+          number of cart items and the total price.
+        """
+
+        added, line, num_cart_items, total_price = result
+        self.catalog.invalidate()
+        if not added:
+            # Another terminal took the stock, reload the quantities the item frames are limited to
+            self.stock.refresh()
+            messagebox.showerror("Cart", f"Not enough {item.name} left in stock.")
+            return
+
+        self.stock.take(item.item_id, quantity)
+        self.session.update(num_cart_items=num_cart_items, total_price=total_price)
+        self.add_to_cart_button_visibilty()
+        messagebox.showinfo("Cart", f"Added {quantity} of {item.name} to the cart.")
+
     def add_to_cart_button_visibilty(self):
         """
         Update visibility of add to cart buttons based on cart contents.
         """
 
-        if self.cart_id:
+        if self.session.cart_id:
             cursor = self.db_conn.cursor()
-            cursor.execute("SELECT item_id FROM cart_item WHERE cart_id = ?", (self.cart_id,))
+            cursor.execute("SELECT item_id FROM cart_item WHERE cart_id = ?", (self.session.cart_id,))
             items = cursor.fetchall()
             for n, i in enumerate(items):
                 items[n] = i[0]
-            for i in self.item_frames:
+            for i in self.item_frames[:len(self.shop_items)]:
                 if i.item.item_id in items:
-                    i.quantity_label.grid_forget()
-                    i.minus_button.grid_forget()
-                    i.plus_button.grid_forget()
-                    i.add_button.grid_forget()
+                    i.show_cart_controls(False)
 
     def log_out(self):
         """
         Log out and restore all global variables to the default.
         """
-        self.master.email = None
-        self.master.admin = None
-        self.master.cart_id = None
-        self.master.total_price = 0
-        self.master.num_cart_items = 0
+        self.session.reset()
         self.switch_to_login_callback()
         
\ No newline at end of file
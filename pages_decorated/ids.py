@@ -0,0 +1,104 @@
+import threading
+
+class IdAllocator:
+    """
+    Hands out IDs for new rows from the id_sequences table.
+
+    IDs are reserved in blocks with a single UPDATE ... RETURNING on a separate connection in autocommit
+    mode, so the reservation is its own short transaction and two terminals sharing the database never
+    get the same ID. The IDs of a block are then handed out from memory without touching the database.
+    IDs that are reserved but never used leave gaps, which is harmless.
+
+    Reserve IDs before writing on the connection that inserts the rows: the reservation takes the write
+    lock of the database for a moment, which it cannot get while another connection of the same process
+    holds it.
+
+    Attributes:
+    - database: The Database the reservation connection is opened on.
+    - block_size: Number of IDs reserved at once for next_id.
+    """
+
+    def __init__(self, database, block_size=10):
+        """
+        Initialize the IdAllocator.
+
+        Parameters:
+        - database: The Database the reservation connection is opened on.
+        - block_size: Number of IDs reserved at once for next_id.
+        """
+
+        self.database = database
+        self.block_size = block_size
+
+        # Used from the main thread and the database executor alike
+        self.lock = threading.Lock()
+        self.connection = None
+
+        # Next ID and end (exclusive) of the reserved block of every sequence
+        self.blocks = {}
+
+    def next_id(self, name):
+        """
+        Get a new ID.
+
+        Parameters:
+        - name: Name of the sequence, which is the name of the table (e.g. "payments").
+
+        Returns:
+        - int: The ID.
+        """
+
+        with self.lock:
+            next_id, end = self.blocks.get(name, (0, 0))
+            if next_id >= end:
+                next_id = self.reserve_block(name, self.block_size)
+                end = next_id + self.block_size
+            self.blocks[name] = (next_id + 1, end)
+            return next_id
+
+    def reserve(self, name, count):
+        """
+        Get a contiguous range of new IDs, e.g. for a batch insert.
+
+        Parameters:
+        - name: Name of the sequence, which is the name of the table (e.g. "discounts").
+        - count: Number of IDs.
+
+        Returns:
+        - int: The first ID of the range.
+        """
+
+        with self.lock:
+            return self.reserve_block(name, count)
+
+    def reserve_block(self, name, count):
+        """
+        Reserve IDs in the database. The caller holds the lock.
+
+        Parameters:
+        - name: Name of the sequence.
+        - count: Number of IDs.
+
+        Returns:
+        - int: The first reserved ID.
+        """
+
+        if self.connection is None:
+            self.connection = self.database.connect(isolation_level=None, check_same_thread=False)
+        # Fetch every row so the statement, and with it the reservation, completes right away
+        cursor = self.connection.execute("UPDATE id_sequences SET next_id = next_id + ? WHERE name = ? \
+                                         RETURNING next_id", (count, name))
+        result = cursor.fetchall()
+        if not result:
+            raise KeyError(f"Unknown ID sequence: {name}")
+        return result[0][0] - count
+
+    def close(self):
+        """
+        Close the connection used for the reservations.
+        """
+
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -1,8 +1,9 @@
 import tkinter as tk
 from tkinter import messagebox, font
 import hashlib
+from page import Page
 
-class LoginPage(tk.Frame):
+class LoginPage(Page):
     """
     Represents the login page of the Tech Trolley application.
 
@@ -11,9 +12,10 @@ class LoginPage(tk.Frame):
     - switch_to_signup_callback: Callback function to switch to the signup page.
     - switch_to_home_callback: Callback function to switch to the home page.
     - db_conn: SQLite database connection.
+    - session: The current Session.
     """
 
-    def __init__(self, master, switch_to_signup_callback, switch_to_home_callback, db_conn):
+    def __init__(self, master, switch_to_signup_callback, switch_to_home_callback, db_conn, session):
         """
         Initialize the LoginPage.
 
@@ -22,14 +24,15 @@ class LoginPage(tk.Frame):
         - switch_to_signup_callback: Callback function to switch to the signup page.
         - switch_to_home_callback: Callback function to switch to the home page.
         - db_conn: SQLite database connection.
+        - session: The current Session.
         """
 
         super().__init__(master)
         self.master = master
-        self.grid_forget()
         self.switch_to_signup_callback = switch_to_signup_callback
         self.switch_to_home_callback = switch_to_home_callback
         self.db_conn = db_conn
+        self.session = session
         self.configure(bg="#d9f4ff")
         self.create_widgets()
 
@@ -76,6 +79,17 @@ class LoginPage(tk.Frame):
         self.signup_button = tk.Button(login_frame, text="Sign Up", command=self.switch_to_signup_callback, font=button_font)
         self.signup_button.grid(row=4, column=0, columnspan=2, pady=10)
 
+    def on_show(self, state):
+        """
+        Clear the login form before the page is shown.
+
+        Parameters:
+        - state: The current Session.
+        """
+
+        self.entry_email.delete(0, tk.END)
+        self.entry_password.delete(0, tk.END)
+
     def login(self):
         """
         Handle the login button click event.
@@ -98,8 +112,7 @@ class LoginPage(tk.Frame):
         if result:
             cursor.execute("SELECT admin FROM customers WHERE email=? AND password=?", (email, self.hash_password(password)))
             admin = cursor.fetchone()[0]
-            self.master.email = email
-            self.master.admin = admin
+            self.session.update(email=email, admin=admin)
             self.switch_to_home_callback()
         else:
             messagebox.showerror("Login", "Invalid email or password")
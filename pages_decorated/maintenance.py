@@ -0,0 +1,290 @@
+import argparse
+import random
+import migrations
+from database import Database
+from ids import IdAllocator
+
+def get_meta(db_conn, key):
+    """
+    Read a maintenance bookkeeping value.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - key: Name of the value.
+
+    Returns:
+    - str: The stored value, or None if it was never recorded.
+    """
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT value FROM app_meta WHERE key = ?", (key,))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+def refresh_discounts(db_conn, ids, rng=None):
+    """
+    Give every non-expired item without an active discount window a new 7-day discount.
+
+    The refresh is idempotent: items that already have an active window are skipped, and once it has
+    run on a given day later calls on the same day do no work. New rows are inserted as one batch
+    inside a single transaction.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - ids: IdAllocator giving the new discounts their IDs.
+    - rng: Optional random.Random instance used to pick discount amounts (seed it for reproducible runs).
+
+    Returns:
+    - int: The number of discounts created.
+    """
+
+    rng = rng if rng else random.Random()
+    cursor = db_conn.cursor()
+
+    # Skip if the refresh already ran today
+    cursor.execute("SELECT DATE('now')")
+    today = cursor.fetchone()[0]
+    if get_meta(db_conn, "discounts_refreshed_on") == today:
+        return 0
+
+    # Fetch the items that haven't expired and have no active discount
+    cursor.execute("""
+        SELECT i.item_id
+        FROM items AS i
+        WHERE i.expiry_date >= DATE('now','-7 day')
+        AND NOT EXISTS (
+            SELECT 1
+            FROM discounts AS d
+            WHERE d.item_id = i.item_id
+            AND d.start_date <= DATE('now')
+            AND d.end_date >= DATE('now')
+        )
+        ORDER BY i.item_id
+    """)
+    items = [i[0] for i in cursor.fetchall()]
+
+    # Reserve the discount ids once for the whole batch
+    first_id = ids.reserve("discounts", len(items)) if items else 0
+    rows = [(first_id + n, item_id, rng.randint(5, 25)) for n, item_id in enumerate(items)]
+
+    with db_conn:
+        cursor.executemany("""INSERT INTO discounts (discount_id, item_id, discount_amount, start_date, end_date)
+                           VALUES (?, ?, ?, DATE('now'), DATE('now', '+7 day'))""", rows)
+        cursor.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('discounts_refreshed_on', ?)", (today,))
+    return len(rows)
+
+def compact_discounts(db_conn, vacuum=False):
+    """
+    Remove discount windows that have expired or duplicate an earlier overlapping window.
+
+    When several windows of an item overlap, the earliest created one that has not expired is the one
+    shown to customers, so the later ones are dropped.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - vacuum: Whether to rebuild the database file afterwards to give the freed space back.
+
+    Returns:
+    - int: The number of discount windows removed.
+    """
+
+    cursor = db_conn.cursor()
+    with db_conn:
+        cursor.execute("""
+            DELETE FROM discounts
+            WHERE end_date < DATE('now')
+            OR EXISTS (
+                SELECT 1
+                FROM discounts AS earlier
+                WHERE earlier.item_id = discounts.item_id
+                AND earlier.discount_id < discounts.discount_id
+                AND earlier.start_date <= discounts.end_date
+                AND earlier.end_date >= discounts.start_date
+                AND earlier.end_date >= DATE('now')
+            )
+        """)
+        removed = cursor.rowcount
+    if vacuum:
+        db_conn.execute("VACUUM")
+    return removed
+
+def rebuild_sales(db_conn):
+    """
+    Recompute the materialized sales counters (item_sales and item_sales_hourly) from the paid carts.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+
+    Returns:
+    - int: The number of items with sales.
+    """
+
+    cursor = db_conn.cursor()
+    with db_conn:
+        for statement in migrations.REBUILD_SALES:
+            cursor.execute(statement)
+        cursor.execute("SELECT COUNT(*) FROM item_sales")
+        return cursor.fetchone()[0]
+
+def prune_sales(db_conn, keep_hours=48):
+    """
+    Delete hourly sales buckets that are too old to count towards the sales of the last 24 hours.
+    Buckets are keyed by the UTC hour of the payment, like SQLite's 'now'.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - keep_hours: Number of recent hours whose buckets are kept.
+
+    Returns:
+    - int: The number of buckets removed.
+    """
+
+    cursor = db_conn.cursor()
+    with db_conn:
+        cursor.execute("DELETE FROM item_sales_hourly WHERE hour < strftime('%Y-%m-%d %H:00:00', 'now', ?)",
+                       (f"-{int(keep_hours)} hours",))
+        return cursor.rowcount
+
+def find_stale_carts(db_conn):
+    """
+    Collect the unpaid shopping carts older than three days whose items are no longer held into the 
+    temporary stale_carts table of the connection, to be released by release_stale_cart_batch.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+
+    Returns:
+    - int: The number of stale carts found.
+    """
+
+    cursor = db_conn.cursor()
+    with db_conn:
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS stale_carts (cart_id INTEGER PRIMARY KEY)")
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS stale_cart_batch (cart_id INTEGER PRIMARY KEY)")
+        cursor.execute("DELETE FROM temp.stale_carts")
+        cursor.execute("""
+            INSERT INTO temp.stale_carts (cart_id)
+            SELECT sc.cart_id
+            FROM shopping_carts AS sc
+            WHERE sc.creation_time <= DATE('now','-3 day')
+            AND NOT EXISTS (SELECT 1 FROM payments AS p WHERE p.cart_id = sc.cart_id)
+            AND NOT EXISTS (
+                SELECT 1
+                FROM cart_item AS ci
+                WHERE ci.cart_id = sc.cart_id
+                AND ci.hold_expires_at > datetime('now')
+            )
+        """)
+        return cursor.rowcount
+
+def release_stale_cart_batch(db_conn, batch_size=200):
+    """
+    Delete the next batch of carts found by find_stale_carts and put their items back in stock, in one
+    transaction. Carts that were paid or used again since they were found are skipped. Stopping between 
+    batches is safe, the remaining carts are found again by the next find_stale_carts.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - batch_size: Maximum number of carts handled.
+
+    Returns:
+    - tuple: The number of carts handled (0 once none is left) and the number of carts removed.
+    """
+
+    cursor = db_conn.cursor()
+    with db_conn:
+        cursor.execute("BEGIN IMMEDIATE")
+
+        # Take the batch off the stale carts
+        cursor.execute("DELETE FROM temp.stale_cart_batch")
+        cursor.execute("INSERT INTO temp.stale_cart_batch (cart_id) \
+                       SELECT cart_id FROM temp.stale_carts ORDER BY cart_id LIMIT ?", (batch_size,))
+        handled = cursor.rowcount
+        cursor.execute("DELETE FROM temp.stale_carts WHERE cart_id IN (SELECT cart_id FROM temp.stale_cart_batch)")
+
+        # Keep the carts paid or held again in the meantime
+        cursor.execute("""
+            DELETE FROM temp.stale_cart_batch
+            WHERE cart_id IN (SELECT cart_id FROM payments)
+            OR cart_id IN (SELECT cart_id FROM cart_item WHERE hold_expires_at > datetime('now'))
+        """)
+
+        cursor.execute("""
+            UPDATE items
+            SET quantity = quantity + released.n
+            FROM (
+                SELECT item_id, SUM(quantity) AS n
+                FROM cart_item
+                WHERE cart_id IN (SELECT cart_id FROM temp.stale_cart_batch)
+                GROUP BY item_id
+            ) AS released
+            WHERE items.item_id = released.item_id
+        """)
+        cursor.execute("DELETE FROM cart_item WHERE cart_id IN (SELECT cart_id FROM temp.stale_cart_batch)")
+        cursor.execute("DELETE FROM shopping_carts WHERE cart_id IN (SELECT cart_id FROM temp.stale_cart_batch)")
+        removed = cursor.rowcount
+    return handled, removed
+
+def release_stale_carts(db_conn, batch_size=200, progress=None):
+    """
+    Delete unpaid shopping carts older than three days and put their items back in stock, batch by batch.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - batch_size: Maximum number of carts handled by a single transaction.
+    - progress: Optional function called with the number of carts handled so far and the number found.
+
+    Returns:
+    - int: The number of carts removed.
+    """
+
+    found = find_stale_carts(db_conn)
+    handled = removed = 0
+    while True:
+        batch_handled, batch_removed = release_stale_cart_batch(db_conn, batch_size)
+        if not batch_handled:
+            return removed
+        handled += batch_handled
+        removed += batch_removed
+        if progress:
+            progress(handled, found)
+
+def main():
+    """
+    Run maintenance commands against the Tech Trolley database from the command line.
+    """
+
+    parser = argparse.ArgumentParser(description="Tech Trolley database maintenance")
+    parser.add_argument("--db", default="techtrolley.db", help="Path to the SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    refresh_parser = commands.add_parser("refresh-discounts", help="Create discounts for items without an active one")
+    refresh_parser.add_argument("--seed", type=int, help="Seed for the discount amounts")
+    compact_parser = commands.add_parser("compact-discounts", help="Remove expired and duplicate discount windows")
+    compact_parser.add_argument("--vacuum", action="store_true", help="Shrink the database file afterwards")
+    commands.add_parser("rebuild-sales", help="Recompute the sales counters from the paid carts")
+    carts_parser = commands.add_parser("release-stale-carts", help="Remove old unpaid carts and restock their items")
+    carts_parser.add_argument("--batch-size", type=int, default=200, help="Carts handled per transaction")
+    args = parser.parse_args()
+
+    database = Database(args.db)
+    db_conn = database.connect()
+    migrations.migrate(db_conn)
+    ids = IdAllocator(database)
+    if args.command == "refresh-discounts":
+        created = refresh_discounts(db_conn, ids, random.Random(args.seed))
+        print(f"Created {created} discounts.")
+    elif args.command == "compact-discounts":
+        removed = compact_discounts(db_conn, vacuum=args.vacuum)
+        print(f"Removed {removed} discount windows.")
+    elif args.command == "rebuild-sales":
+        items = rebuild_sales(db_conn)
+        print(f"Rebuilt the sales counters of {items} items.")
+    elif args.command == "release-stale-carts":
+        removed = release_stale_carts(db_conn, args.batch_size,
+                                      progress=lambda handled, found: print(f"Handled {handled} of {found} carts."))
+        print(f"Removed {removed} carts.")
+    ids.close()
+    db_conn.close()
+
+if __name__ == "__main__":
+    main()
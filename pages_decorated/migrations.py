@@ -0,0 +1,259 @@
+import sqlite3
+from database import Database
+
+# Product categories, which prefix every item name (e.g. "Dairy Milk"). Used to seed the categories table.
+CATEGORIES = ["Dairy", "Bakery", "Beverages", "Snacks", "Meat", "Seafood", "Produce", "Canned Goods",
+              "Frozen Food", "Personal Care"]
+
+def category_of(column):
+    """
+    Build an SQL expression that extracts the category from an item name column.
+
+    Parameters:
+    - column: The SQL expression holding the item name.
+
+    Returns:
+    - str: A CASE expression evaluating to the category, or an empty string if there is none.
+    """
+
+    cases = " ".join(f"WHEN {column} LIKE '{category} %' THEN '{category}'" for category in CATEGORIES)
+    return f"CASE {cases} ELSE '' END"
+
+def refresh_brand_attributes(brand_id):
+    """
+    Build the statements recomputing the brand_attributes row of a brand from its stakeholders.
+
+    Parameters:
+    - brand_id: The SQL expression holding the brand ID (e.g. "new.brand_id" inside a trigger).
+
+    Returns:
+    - str: The statements, each ending with a semicolon.
+    """
+
+    return f"""
+        DELETE FROM brand_attributes WHERE brand_id = {brand_id};
+        INSERT INTO brand_attributes (brand_id, egyptian_share, total_share, stakeholders)
+        SELECT brand_id, SUM(CASE WHEN nationality = 'Egyptian' THEN share END), SUM(share), COUNT(*)
+        FROM stakeholders
+        WHERE brand_id = {brand_id}
+        GROUP BY brand_id;
+    """
+
+# Recompute the materialized sales counters from the paid carts. Used to backfill them and by the
+# rebuild-sales maintenance command.
+REBUILD_SALES = [
+    "DELETE FROM item_sales",
+    "DELETE FROM item_sales_hourly",
+    """INSERT INTO item_sales (item_id, sold)
+       SELECT ci.item_id, SUM(ci.quantity)
+       FROM payments AS p
+       JOIN cart_item AS ci ON ci.cart_id = p.cart_id
+       GROUP BY ci.item_id""",
+    """INSERT INTO item_sales_hourly (hour, item_id, sold)
+       SELECT strftime('%Y-%m-%d %H:00:00', p.payment_date), ci.item_id, SUM(ci.quantity)
+       FROM payments AS p
+       JOIN cart_item AS ci ON ci.cart_id = p.cart_id
+       GROUP BY 1, 2""",
+]
+
+# Ordered schema migrations. Each entry is (version, statements); the version reached is stored in
+# PRAGMA user_version so every migration runs exactly once per database.
+MIGRATIONS = [
+    (1, [
+        "CREATE TABLE IF NOT EXISTS app_meta (key VARCHAR(100) PRIMARY KEY, value TEXT)",
+        "CREATE INDEX IF NOT EXISTS idx_cart_item_item_id ON cart_item (item_id)",
+        "CREATE INDEX IF NOT EXISTS idx_discounts_item_window ON discounts (item_id, start_date, end_date)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_cart_id ON payments (cart_id)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_payment_date ON payments (payment_date)",
+        "CREATE INDEX IF NOT EXISTS idx_stakeholders_brand_nationality ON stakeholders (brand_id, nationality)",
+        "CREATE INDEX IF NOT EXISTS idx_items_brand_id ON items (brand_id)",
+        "CREATE INDEX IF NOT EXISTS idx_items_price ON items (price)",
+        "CREATE INDEX IF NOT EXISTS idx_shopping_carts_creation_time ON shopping_carts (creation_time)",
+    ]),
+    (2, [
+        # Full-text index over item name, category and brand name, keyed by item_id
+        "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(name, category, brand_name)",
+        "DELETE FROM items_fts",
+        f"""INSERT INTO items_fts (rowid, name, category, brand_name)
+            SELECT i.item_id, i.name, {category_of("i.name")}, b.name
+            FROM items AS i
+            LEFT JOIN brands AS b ON b.brand_id = i.brand_id""",
+        f"""CREATE TRIGGER IF NOT EXISTS items_fts_after_insert AFTER INSERT ON items BEGIN
+                INSERT INTO items_fts (rowid, name, category, brand_name)
+                VALUES (new.item_id, new.name, {category_of("new.name")},
+                        (SELECT name FROM brands WHERE brand_id = new.brand_id));
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS items_fts_after_update AFTER UPDATE OF item_id, name, brand_id ON items BEGIN
+                DELETE FROM items_fts WHERE rowid = old.item_id;
+                INSERT INTO items_fts (rowid, name, category, brand_name)
+                VALUES (new.item_id, new.name, {category_of("new.name")},
+                        (SELECT name FROM brands WHERE brand_id = new.brand_id));
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS items_fts_after_delete AFTER DELETE ON items BEGIN
+                DELETE FROM items_fts WHERE rowid = old.item_id;
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS brands_fts_after_insert AFTER INSERT ON brands BEGIN
+                UPDATE items_fts SET brand_name = new.name
+                WHERE rowid IN (SELECT item_id FROM items WHERE brand_id = new.brand_id);
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS brands_fts_after_update AFTER UPDATE OF name ON brands BEGIN
+                UPDATE items_fts SET brand_name = new.name
+                WHERE rowid IN (SELECT item_id FROM items WHERE brand_id = new.brand_id);
+            END""",
+    ]),
+    (3, [
+        # Normalized categories, backfilled from the item name prefixes
+        """CREATE TABLE IF NOT EXISTS categories (
+            category_id INTEGER PRIMARY KEY,
+            name VARCHAR(100) UNIQUE
+        )""",
+        "INSERT OR IGNORE INTO categories (name) VALUES " + ", ".join(f"('{category}')" for category in CATEGORIES),
+        "ALTER TABLE items ADD COLUMN category_id INT(11) REFERENCES categories(category_id)",
+        """UPDATE items
+           SET category_id = (SELECT category_id FROM categories WHERE items.name LIKE categories.name || ' %')""",
+        "CREATE INDEX IF NOT EXISTS idx_items_category_id ON items (category_id)",
+
+        # Index the category name from the table instead of the name prefix
+        "DROP TRIGGER IF EXISTS items_fts_after_insert",
+        "DROP TRIGGER IF EXISTS items_fts_after_update",
+        """CREATE TRIGGER items_fts_after_insert AFTER INSERT ON items BEGIN
+                INSERT INTO items_fts (rowid, name, category, brand_name)
+                VALUES (new.item_id, new.name,
+                        (SELECT name FROM categories WHERE category_id = new.category_id),
+                        (SELECT name FROM brands WHERE brand_id = new.brand_id));
+            END""",
+        """CREATE TRIGGER items_fts_after_update AFTER UPDATE OF item_id, name, brand_id, category_id ON items BEGIN
+                DELETE FROM items_fts WHERE rowid = old.item_id;
+                INSERT INTO items_fts (rowid, name, category, brand_name)
+                VALUES (new.item_id, new.name,
+                        (SELECT name FROM categories WHERE category_id = new.category_id),
+                        (SELECT name FROM brands WHERE brand_id = new.brand_id));
+            END""",
+        """CREATE TRIGGER categories_fts_after_update AFTER UPDATE OF name ON categories BEGIN
+                UPDATE items_fts SET category = new.name
+                WHERE rowid IN (SELECT item_id FROM items WHERE category_id = new.category_id);
+            END""",
+    ]),
+    (4, [
+        # Paid units per item, over the item's lifetime and per hour for the "Sold in 24h" figure
+        """CREATE TABLE IF NOT EXISTS item_sales (
+            item_id INTEGER PRIMARY KEY REFERENCES items(item_id),
+            sold INT(11) NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS item_sales_hourly (
+            hour DATETIME NOT NULL,
+            item_id INT(11) NOT NULL REFERENCES items(item_id),
+            sold INT(11) NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, item_id)
+        ) WITHOUT ROWID""",
+    ] + REBUILD_SALES),
+    (5, [
+        # Facts derived from the stakeholders of every brand, kept up to date by triggers
+        """CREATE TABLE IF NOT EXISTS brand_attributes (
+            brand_id INTEGER PRIMARY KEY REFERENCES brands(brand_id),
+            egyptian_share INT(11),
+            total_share INT(11),
+            stakeholders INT(11) NOT NULL DEFAULT 0
+        )""",
+        "DELETE FROM brand_attributes",
+        """INSERT INTO brand_attributes (brand_id, egyptian_share, total_share, stakeholders)
+           SELECT brand_id, SUM(CASE WHEN nationality = 'Egyptian' THEN share END), SUM(share), COUNT(*)
+           FROM stakeholders
+           WHERE brand_id IS NOT NULL
+           GROUP BY brand_id""",
+        f"""CREATE TRIGGER IF NOT EXISTS stakeholders_attributes_after_insert AFTER INSERT ON stakeholders BEGIN
+                {refresh_brand_attributes("new.brand_id")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS stakeholders_attributes_after_update
+            AFTER UPDATE OF nationality, share, brand_id ON stakeholders BEGIN
+                {refresh_brand_attributes("old.brand_id")}
+                {refresh_brand_attributes("new.brand_id")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS stakeholders_attributes_after_delete AFTER DELETE ON stakeholders BEGIN
+                {refresh_brand_attributes("old.brand_id")}
+            END""",
+    ]),
+    (6, [
+        # Next free ID of every table, reserved in blocks by ids.IdAllocator
+        """CREATE TABLE IF NOT EXISTS id_sequences (
+            name VARCHAR(50) PRIMARY KEY,
+            next_id INTEGER NOT NULL
+        )""",
+        """INSERT OR REPLACE INTO id_sequences (name, next_id)
+           SELECT 'shopping_carts', COALESCE(MAX(cart_id), 0) + 1 FROM shopping_carts
+           UNION ALL SELECT 'payments', COALESCE(MAX(payment_id), 0) + 1 FROM payments
+           UNION ALL SELECT 'items', COALESCE(MAX(item_id), 0) + 1 FROM items
+           UNION ALL SELECT 'brands', COALESCE(MAX(brand_id), 0) + 1 FROM brands
+           UNION ALL SELECT 'discounts', COALESCE(MAX(discount_id), 0) + 1 FROM discounts""",
+    ]),
+    (7, [
+        # Time until which an unpaid cart line holds its units of stock, NULL once paid. Lines of unpaid
+        # carts keep the previous three days from the creation of their cart
+        "ALTER TABLE cart_item ADD COLUMN hold_expires_at DATETIME",
+        """UPDATE cart_item
+           SET hold_expires_at = (SELECT datetime(sc.creation_time, '+3 day')
+                                  FROM shopping_carts AS sc
+                                  WHERE sc.cart_id = cart_item.cart_id)
+           WHERE cart_id NOT IN (SELECT cart_id FROM payments)""",
+        """CREATE INDEX IF NOT EXISTS idx_cart_item_hold_expires_at ON cart_item (hold_expires_at)
+           WHERE hold_expires_at IS NOT NULL""",
+    ]),
+]
+
+def schema_version(db_conn):
+    """
+    Read the schema version recorded in the database.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+
+    Returns:
+    - int: The current schema version.
+    """
+
+    return db_conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(db_conn):
+    """
+    Bring the database schema up to date by applying every pending migration.
+
+    Each migration runs in its own transaction together with the version bump, so an interrupted
+    run leaves the database at the last fully applied version. The write lock is taken before the
+    version is checked again, so terminals starting at the same time apply every migration once.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+
+    Returns:
+    - int: The schema version after migrating.
+    """
+
+    current = schema_version(db_conn)
+    for version, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        cursor = db_conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+
+            # Another terminal may have applied the migration since the version was read
+            current = schema_version(db_conn)
+            if version <= current:
+                db_conn.rollback()
+                continue
+
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            db_conn.commit()
+        except sqlite3.Error:
+            db_conn.rollback()
+            raise
+        current = version
+    return current
+
+if __name__ == "__main__":
+    # Same connection settings as the application (WAL journaling, busy timeout)
+    conn = Database("techtrolley.db").connect()
+    print(f"Schema version: {migrate(conn)}")
+    conn.close()
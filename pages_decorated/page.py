@@ -0,0 +1,30 @@
+import tkinter as tk
+
+class Page(tk.Frame):
+    """
+    Base class for the pages of the Tech Trolley application.
+
+    Pages are built once by the main application and kept for the whole session. Every time a page
+    is shown its on_show hook refreshes it from the current state, and teardown releases it when the
+    application closes.
+    """
+
+    def on_show(self, state):
+        """
+        Refresh the page right before it is shown.
+
+        Parameters:
+        - state: The current Session.
+        """
+
+    def on_hide(self):
+        """
+        Called right after the page is hidden.
+        """
+
+    def teardown(self):
+        """
+        Destroy the page and release its resources.
+        """
+
+        self.destroy()
@@ -2,8 +2,79 @@ import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox, font
 import re 
+import sqlite3
+from page import Page
+from reservations import renew_holds
 
-class PaymentPage(tk.Frame):
+def record_payment(db_conn, ids, cart_id, num_cart_items, payment_method, promocodes):
+    """
+    Store a payment and the promocodes applied to it, make the reservation of the paid items permanent 
+    and add the paid units to the sales counters. Runs on the database executor.
+
+    The hold of a line may expire while the customer is paying, and the sweeper then returns its units 
+    to the stock. The payment therefore fails with a ValueError unless the cart still has the lines the 
+    customer saw, and the paid price is computed from those lines in the same transaction.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - ids: IdAllocator giving the payment its ID.
+    - cart_id: ID of the paid shopping cart.
+    - num_cart_items: Number of lines the customer is paying for.
+    - payment_method: The selected payment method.
+    - promocodes: List of the applied promocodes.
+
+    Returns:
+    - tuple: ID of the new payment and the paid price.
+    """
+
+    # Take the ID before writing, the allocator may need the write lock
+    payment_id = ids.next_id("payments")
+    cursor = db_conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+
+        # Paid lines never expire
+        cursor.execute("UPDATE cart_item SET hold_expires_at = NULL WHERE cart_id = ?", (cart_id,))
+        if cursor.rowcount != num_cart_items:
+            db_conn.rollback()
+            if cursor.rowcount == 0:
+                raise ValueError("the reserved items were released, please add them to the cart again")
+            raise ValueError("some of the reserved items were released, please check your cart")
+
+        # Price of the paid lines with every promocode taken off, as shown on the payment page
+        cursor.execute("SELECT SUM(i.price * ci.quantity) \
+                       FROM cart_item AS ci \
+                       JOIN items AS i \
+                       ON i.item_id = ci.item_id \
+                       WHERE ci.cart_id = ?", (cart_id,))
+        total_price = cursor.fetchone()[0]
+        for i in promocodes:
+            cursor.execute("SELECT discount_amount FROM promocodes WHERE code = ?", (i,))
+            total_price *= 1 - (cursor.fetchone()[0] / 100)
+            cursor.execute("INSERT INTO payment_promocode (payment_id, code) VALUES (?, ?)", (payment_id, i))
+        total_price = round(total_price, 2)
+        cursor.execute("INSERT INTO payments (payment_id, cart_id, total_price, payment_method, payment_date) \
+                        VALUES (?, ?, ?, ?, datetime('now'))",
+                       (payment_id, cart_id, total_price, payment_method))
+
+        # Count the paid units in the materialized sales counters, in the same transaction as the payment
+        cursor.execute("""INSERT INTO item_sales (item_id, sold)
+                          SELECT item_id, SUM(quantity) FROM cart_item WHERE cart_id = ? GROUP BY item_id
+                          ON CONFLICT (item_id) DO UPDATE SET sold = sold + excluded.sold""", (cart_id,))
+        cursor.execute("""INSERT INTO item_sales_hourly (hour, item_id, sold)
+                          SELECT strftime('%Y-%m-%d %H:00:00', p.payment_date), ci.item_id, SUM(ci.quantity)
+                          FROM payments AS p
+                          JOIN cart_item AS ci ON ci.cart_id = p.cart_id
+                          WHERE p.payment_id = ?
+                          GROUP BY 1, 2
+                          ON CONFLICT (hour, item_id) DO UPDATE SET sold = sold + excluded.sold""", (payment_id,))
+        db_conn.commit()
+    except sqlite3.Error:
+        db_conn.rollback()
+        raise
+    return payment_id, total_price
+
+class PaymentPage(Page):
     """
     Represents the payment page of the Tech Trolley application.
 
@@ -12,12 +83,14 @@ class PaymentPage(tk.Frame):
     - switch_to_cart_callback: Callback function to switch to the cart page.
     - switch_to_home_callback: Callback function to switch to the home page.
     - db_conn: SQLite database connection.
-    - cart_id: ID of the current shopping cart.
-    - total_price: Total price of items in the cart.
-    - num_cart_items: Number of items in the cart.
+    - executor: DatabaseExecutor storing the payments in the background.
+    - catalog: CatalogSnapshot invalidated when sales change.
+    - session: The current Session.
+    - ids: IdAllocator giving new payments their ID.
     """
 
-    def __init__(self, master, switch_to_cart_callback, switch_to_home_callback, db_conn, cart_id, total_price, num_cart_items):
+    def __init__(self, master, switch_to_cart_callback, switch_to_home_callback, db_conn, executor, catalog, session, 
+                 ids):
         """
         Initialize the PaymentPage.
 
@@ -26,20 +99,24 @@ class PaymentPage(tk.Frame):
         - switch_to_cart_callback: Callback function to switch to the cart page.
         - switch_to_home_callback: Callback function to switch to the home page.
         - db_conn: SQLite database connection.
-        - cart_id: ID of the current shopping cart.
-        - total_price: Total price of items in the cart.
-        - num_cart_items: Number of items in the cart.
+        - executor: DatabaseExecutor storing the payments in the background.
+        - catalog: CatalogSnapshot invalidated when sales change.
+        - session: The current Session.
+        - ids: IdAllocator giving new payments their ID.
         """
 
         super().__init__(master)
         self.switch_to_cart_callback = switch_to_cart_callback
         self.switch_to_home_callback = switch_to_home_callback
         self.db_conn = db_conn
-        self.cart_id = cart_id
-        self.total_price = total_price if total_price else 0
-        self.num_cart_items = num_cart_items
+        self.executor = executor
+        self.catalog = catalog
+        self.session = session
+        self.ids = ids
+
+        # Price to be paid, the cart total with the applied promocodes taken off
+        self.total_price = session.total_price if session.total_price else 0
         self.visa = 0
-        self.grid(row=0, column=0, sticky="nsew")
         self.grid_rowconfigure(0, weight=1)
         self.grid_rowconfigure(2, weight=1)
         self.grid_columnconfigure(0, weight=1)
@@ -70,10 +147,13 @@ class PaymentPage(tk.Frame):
         self.top_right_frame.grid(row=0, column=2, sticky="ne", padx=10, pady=10)
 
         # Create the cart button and place it in the top_right_frame
-        self.button_cart = tk.Button(self.top_right_frame, image=self.cart_image, compound="bottom", text=self.num_cart_items,
+        self.button_cart = tk.Button(self.top_right_frame, image=self.cart_image, compound="bottom", text=self.session.num_cart_items,
                                      font=button_font, command=self.switch_to_cart_callback)
         self.button_cart.pack(side="right", padx=5, pady=5)
 
+        # Keep the cart badge in sync with the session
+        self.session.subscribe("num_cart_items", self.update_cart_badge)
+
         # Center frame for the other widgets with a white background
         self.center_frame = tk.Frame(self, bg="#ffffff" , padx = 10, pady = 20)
         self.center_frame.grid(row=1, column=1, sticky="nsew", padx=50, pady=50)
@@ -154,6 +234,47 @@ class PaymentPage(tk.Frame):
         self.button_payment = tk.Button(self.center_frame, text="Confirm Payemnt", command=self.confirm_payment, font=button_font)
         self.button_payment.grid(row=8, column=0, columnspan=3, pady=20)
 
+    def on_show(self, state):
+        """
+        Reset the payment form for the current cart before the page is shown.
+
+        Parameters:
+        - state: The current Session.
+        """
+
+        self.total_price = state.total_price if state.total_price else 0
+        self.applied_promocodes = []
+        self.total_price_label.configure(text=f"Total price: ${round(self.total_price, 2)}")
+
+        # Keep the items reserved while paying
+        if state.cart_id:
+            self.executor.submit(renew_holds, state.cart_id)
+
+        # Clear the form and hide the Visa details
+        for entry in (self.entry_promo_code, self.entry_visa_number, self.entry_expiry_date, self.entry_cvv,
+                      self.entry_address):
+            entry.delete(0, tk.END)
+        self.payment_method_var.set("")
+        self.on_payment_method_changed()
+
+    def update_cart_badge(self, num_cart_items):
+        """
+        Show the number of items in the cart on the cart button.
+
+        Parameters:
+        - num_cart_items: Number of items in the cart.
+        """
+
+        self.button_cart.configure(text=num_cart_items)
+
+    def teardown(self):
+        """
+        Stop following the session and destroy the page.
+        """
+
+        self.session.unsubscribe("num_cart_items", self.update_cart_badge)
+        super().teardown()
+
     def on_payment_method_changed(self, event=None):
         """
         Handle the event when the payment method is changed in the Combobox.
@@ -312,19 +433,42 @@ class PaymentPage(tk.Frame):
             messagebox.showerror("Payment", "Please fill in all fields")
             return
 
-        # Insert payment details into the database
-        cursor = self.db_conn.cursor()
-        cursor.execute("SELECT payment_id FROM payments ORDER BY payment_id DESC LIMIT 1")
-        result = cursor.fetchone()
-        payment_id = int(result[0]) + 1
-        for i in self.applied_promocodes:
-            cursor.execute("INSERT INTO payment_promocode (payment_id, code) VALUES (?, ?)", (payment_id, i))
-        cursor.execute("INSERT INTO payments (payment_id, cart_id, total_price, payment_method, payment_date) \
-                        VALUES (?, ?, ?, ?, datetime('now'))",
-                       (payment_id, self.cart_id, round(self.total_price, 2), payment_method))
-        self.db_conn.commit()
+        # Insert payment details into the database, blocking the button so the cart isn't paid twice
+        self.button_payment.configure(state="disabled")
+        self.executor.submit(record_payment, self.ids, self.session.cart_id, self.session.num_cart_items, payment_method,
+                             list(self.applied_promocodes), on_done=self.payment_recorded, on_error=self.payment_failed)
+
+    def payment_recorded(self, result):
+        """
+        Finish the checkout once the payment is stored.
+
+        Parameters:
+        - result: Tuple containing the ID of the new payment and the paid price.
+        """
+
+        payment_id, total_price = result
+        self.button_payment.configure(state="normal")
+        self.catalog.invalidate()
+
+        # The cart is paid, the next item added starts a new one
+        self.session.update(cart_id=None, total_price=0, num_cart_items=0)
 
         # Show success message and switch to the home page
-        messagebox.showinfo("Payment", "Payment processed successfully.")
+        messagebox.showinfo("Payment", f"Payment of ${total_price} processed successfully.")
         self.switch_to_home_callback()
 
+    def payment_failed(self, error):
+        """
+        Report a payment that couldn't be stored.
+
+        Parameters:
+        - error: The raised exception.
+        """
+
+        self.button_payment.configure(state="normal")
+        messagebox.showerror("Payment", f"The payment couldn't be processed: {error}")
+
+        # Released items are no longer in the cart, show what is left in it
+        if isinstance(error, ValueError):
+            self.switch_to_cart_callback()
+
@@ -0,0 +1,73 @@
+import time
+from collections import OrderedDict
+
+class QueryCache:
+    """
+    LRU cache of query results with a time to live.
+
+    Every entry remembers the data version it was computed from (e.g. CatalogSnapshot.version, which
+    is bumped by every write to the catalog data) and is only served while that version is current
+    and the entry is younger than the time to live.
+
+    Attributes:
+    - capacity: Maximum number of results kept.
+    - ttl: Seconds a result may be served for.
+    """
+
+    def __init__(self, capacity=64, ttl=60):
+        """
+        Initialize an empty QueryCache.
+
+        Parameters:
+        - capacity: Maximum number of results kept.
+        - ttl: Seconds a result may be served for.
+        """
+
+        self.capacity = capacity
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key, version):
+        """
+        Get a cached result.
+
+        Parameters:
+        - key: Key of the query.
+        - version: The current data version.
+
+        Returns:
+        - The cached result, or None if there is no valid one.
+        """
+
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        stored_at, stored_version, result = entry
+        if stored_version != version or time.monotonic() - stored_at >= self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, version, result):
+        """
+        Store a result, evicting the least recently used one when the cache is full.
+
+        Parameters:
+        - key: Key of the query.
+        - version: The data version the result was computed from.
+        - result: The result to be stored.
+        """
+
+        self.entries[key] = (time.monotonic(), version, result)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove every cached result.
+        """
+
+        self.entries.clear()
@@ -0,0 +1,155 @@
+import sqlite3
+
+# Seconds a cart line holds its units of stock after it was last added, changed or looked at. Expired
+# lines are removed from their carts and their units put back in stock by the HoldSweeper
+HOLD_TTL = 30 * 60
+
+def hold_modifier(ttl=None):
+    """
+    Build the SQLite date modifier moving "now" to the end of a hold, e.g. datetime('now', ?).
+
+    Parameters:
+    - ttl: Seconds the hold lasts (HOLD_TTL if omitted).
+
+    Returns:
+    - str: The modifier.
+    """
+
+    return f"{int(ttl if ttl is not None else HOLD_TTL):+d} seconds"
+
+def renew_holds(db_conn, cart_id, ttl=None):
+    """
+    Extend the holds of every line of a cart, e.g. while the customer is looking at it or paying for it.
+    Runs on the database executor.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - cart_id: ID of the shopping cart.
+    - ttl: Seconds the holds last from now (HOLD_TTL if omitted).
+
+    Returns:
+    - int: The number of renewed lines.
+    """
+
+    cursor = db_conn.cursor()
+    cursor.execute("UPDATE cart_item SET hold_expires_at = datetime('now', ?) \
+                   WHERE cart_id = ? AND hold_expires_at IS NOT NULL", (hold_modifier(ttl), cart_id))
+    db_conn.commit()
+    return cursor.rowcount
+
+def release_expired_holds(db_conn, batch_size=100):
+    """
+    Remove a batch of cart lines whose hold expired and put their units back in stock, in one short
+    transaction. Runs on the database executor.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - batch_size: Maximum number of lines released.
+
+    Returns:
+    - int: The number of released lines, fewer than batch_size once every expired line is released.
+    """
+
+    cursor = db_conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT cart_id, item_id, quantity FROM cart_item \
+                       WHERE hold_expires_at <= datetime('now') \
+                       LIMIT ?", (batch_size,))
+        lines = cursor.fetchall()
+        cursor.executemany("UPDATE items SET quantity = quantity + ? WHERE item_id = ?",
+                           [(quantity, item_id) for _, item_id, quantity in lines])
+        cursor.executemany("DELETE FROM cart_item WHERE cart_id = ? AND item_id = ?",
+                           [(cart_id, item_id) for cart_id, item_id, _ in lines])
+        db_conn.commit()
+    except sqlite3.Error:
+        db_conn.rollback()
+        raise
+    return len(lines)
+
+class HoldSweeper:
+    """
+    Periodically releases the expired cart lines in the background.
+
+    Every sweep releases one small batch on the database executor, so a transaction never holds the
+    write lock for long. While full batches come back the next one follows right away, otherwise the
+    sweeper waits for the next interval.
+
+    Attributes:
+    - root: The Tk root widget used to schedule the sweeps.
+    - executor: DatabaseExecutor running the sweeps.
+    - interval: Milliseconds between two sweeps once nothing is left to release.
+    - batch_size: Maximum number of lines released by a single transaction.
+    - on_release: Function called with the number of released lines after every batch that released some.
+    """
+
+    def __init__(self, root, executor, interval=60000, batch_size=100, on_release=None):
+        """
+        Initialize the HoldSweeper. Call start() to begin sweeping.
+
+        Parameters:
+        - root: The Tk root widget used to schedule the sweeps.
+        - executor: DatabaseExecutor running the sweeps.
+        - interval: Milliseconds between two sweeps once nothing is left to release.
+        - batch_size: Maximum number of lines released by a single transaction.
+        - on_release: Function called with the number of released lines after every batch that released some.
+        """
+
+        self.root = root
+        self.executor = executor
+        self.interval = interval
+        self.batch_size = batch_size
+        self.on_release = on_release
+        self.after_id = None
+
+    def start(self, delay=0):
+        """
+        Schedule the next sweep.
+
+        Parameters:
+        - delay: Milliseconds before the sweep.
+        """
+
+        self.stop()
+        self.after_id = self.root.after(delay, self.sweep)
+
+    def stop(self):
+        """
+        Cancel the scheduled sweep.
+        """
+
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def sweep(self):
+        """
+        Release one batch of expired lines in the background.
+        """
+
+        self.after_id = None
+        self.executor.submit(release_expired_holds, self.batch_size, key="hold sweep",
+                             on_done=self.swept, on_error=self.sweep_failed)
+
+    def swept(self, released):
+        """
+        Report the released lines and schedule the next sweep.
+
+        Parameters:
+        - released: Number of lines released by the batch.
+        """
+
+        if released and self.on_release:
+            self.on_release(released)
+        self.start(0 if released >= self.batch_size else self.interval)
+
+    def sweep_failed(self, error):
+        """
+        Report a failed sweep and try again at the next interval.
+
+        Parameters:
+        - error: The raised exception.
+        """
+
+        self.start(self.interval)
+        self.root.report_callback_exception(type(error), error, error.__traceback__)
@@ -0,0 +1,75 @@
+class Session:
+    """
+    Holds the state of the current user session and notifies subscribers when it changes.
+
+    Pages read the state from here instead of keeping their own copies, and subscribe to the values
+    they display (e.g. the cart badge follows num_cart_items) so they never have to query the
+    database just to stay consistent.
+
+    Attributes:
+    - email: Email address of the logged in customer.
+    - admin: Boolean indicating if the user is an admin.
+    - cart_id: ID of the current shopping cart.
+    - total_price: Total price of items in the cart.
+    - num_cart_items: Number of items in the cart.
+    """
+
+    DEFAULTS = {"email": None, "admin": None, "cart_id": None, "total_price": 0, "num_cart_items": 0}
+
+    def __init__(self):
+        """
+        Initialize an empty Session.
+        """
+
+        self.subscribers = {}
+        for key, value in self.DEFAULTS.items():
+            setattr(self, key, value)
+
+    def subscribe(self, key, callback):
+        """
+        Call a function every time a value of the session changes.
+
+        Parameters:
+        - key: Name of the value to watch.
+        - callback: Function called with the new value.
+        """
+
+        self.subscribers.setdefault(key, []).append(callback)
+
+    def unsubscribe(self, key, callback):
+        """
+        Stop calling a function subscribed with subscribe.
+
+        Parameters:
+        - key: Name of the watched value.
+        - callback: The subscribed function.
+        """
+
+        if callback in self.subscribers.get(key, []):
+            self.subscribers[key].remove(callback)
+
+    def update(self, **changes):
+        """
+        Change values of the session and notify the subscribers of the ones that changed.
+
+        Parameters:
+        - changes: New values, keyed by name.
+        """
+
+        changed = []
+        for key, value in changes.items():
+            if key not in self.DEFAULTS:
+                raise AttributeError(f"Unknown session value: {key}")
+            if getattr(self, key, None) != value:
+                setattr(self, key, value)
+                changed.append(key)
+        for key in changed:
+            for callback in list(self.subscribers.get(key, [])):
+                callback(getattr(self, key))
+
+    def reset(self):
+        """
+        Restore all values to their defaults, e.g. when the user logs out.
+        """
+
+        self.update(**self.DEFAULTS)
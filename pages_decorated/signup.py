@@ -2,33 +2,56 @@ import tkinter as tk
 from tkinter import messagebox, font
 import hashlib
 import re
+import sqlite3
+from page import Page
 
-class SignUpPage(tk.Frame):
+def register_customer(db_conn, email, password, first_name, last_name, phone_number, admin):
+    """
+    Register a customer or an admin. Runs on the database executor.
+
+    Parameters:
+    - db_conn: SQLite database connection.
+    - email: Email of the account.
+    - password: Hashed password.
+    - first_name: First name.
+    - last_name: Last name.
+    - phone_number: Phone number.
+    - admin: Whether the account is an admin.
+    """
+
+    # Insert user into the database
+    with db_conn:
+        db_conn.execute("INSERT INTO customers (email, password, first_name, last_name, phone_number, admin) \
+                        VALUES (?, ?, ?, ?, ?, ?)",
+                        (email, password, first_name, last_name, phone_number, admin))
+
+class SignUpPage(Page):
     """
     Represents the signup page of the Tech Trolley application.
 
     Attributes:
     - master: The master widget.
     - switch_to_login_callback: Callback function to switch to the login page.
-    - db_conn: SQLite database connection.
-    - admin: Boolean indicating whether the user signing up is an admin.
+    - executor: DatabaseExecutor registering the accounts in the background.
+    - session: The current Session, whose admin flag tells whether an admin is adding another admin.
     """
 
-    def __init__(self, master, switch_to_login_callback, db_conn, admin):
+    def __init__(self, master, switch_to_login_callback, executor, session):
         """
         Initialize the SignUpPage.
 
         Parameters:
         - master: The master widget.
         - switch_to_login_callback: Callback function to switch to the login page.
-        - db_conn: SQLite database connection.
-        - admin: Boolean indicating whether the user signing up is an admin.
+        - executor: DatabaseExecutor registering the accounts in the background.
+        - session: The current Session, whose admin flag tells whether an admin is adding another admin.
         """
 
         super().__init__(master)
         self.switch_to_login_callback = switch_to_login_callback
-        self.db_conn = db_conn
-        self.admin = admin
+        self.executor = executor
+        self.session = session
+        self.admin = session.admin
         self.configure(bg='#d9f4ff')
         self.create_widgets()
 
@@ -96,9 +119,21 @@ class SignUpPage(tk.Frame):
                                                  font=button_font)
         self.switch_to_login_button.grid(row=8, column=0, columnspan=2, pady=10)
 
+    def on_show(self, state):
+        """
+        Clear the signup form and adapt it to whether an admin is adding another admin.
+
+        Parameters:
+        - state: The current Session.
+        """
+
+        self.admin = state.admin
+        for entry in (self.entry_signup_firstname, self.entry_signup_lastname, self.entry_signup_email,
+                      self.entry_signup_password, self.entry_confirm_password, self.entry_signup_phone):
+            entry.delete(0, tk.END)
+
         # If Admin, show "Add admin" option
-        if self.admin:
-            self.signup_button.configure(text="Add admin")
+        self.signup_button.configure(text="Add admin" if self.admin else "Sign Up")
 
     def signup(self):
         """
@@ -140,13 +175,20 @@ class SignUpPage(tk.Frame):
         # Hash the password
         password = self.hash_password(password)
 
-        # Insert user into the database
-        with self.db_conn:
-            cursor = self.db_conn.cursor()
-            cursor.execute("INSERT INTO customers (email, password, first_name, last_name, phone_number, admin) \
-                            VALUES (?, ?, ?, ?, ?, ?)",
-                            (email, password, first_name, last_name, phone_number, self.admin if self.admin else False))
-            self.db_conn.commit()
+        # Register the account on the database executor, blocking the button so it isn't sent twice
+        self.signup_button.configure(state="disabled")
+        self.executor.submit(register_customer, email, password, first_name, last_name, phone_number,
+                             self.admin if self.admin else False, on_done=self.registered, on_error=self.register_failed)
+
+    def registered(self, result):
+        """
+        Report an account that was registered.
+
+        Parameters:
+        - result: The result of the job, unused.
+        """
+
+        self.signup_button.configure(state="normal")
 
         # Show appropriate success message
         if self.admin:
@@ -154,6 +196,20 @@ class SignUpPage(tk.Frame):
         else:
             messagebox.showinfo("Sign Up", "Account successfully registered.")
 
+    def register_failed(self, error):
+        """
+        Report an account that couldn't be registered.
+
+        Parameters:
+        - error: The raised exception.
+        """
+
+        self.signup_button.configure(state="normal")
+        if isinstance(error, sqlite3.IntegrityError):
+            messagebox.showerror("Sign Up", "An account with this email already exists.")
+        else:
+            messagebox.showerror("Sign Up", f"The account couldn't be registered: {error}")
+
     def hash_password(self, password):
         """
         Hash the password using SHA-256.
@@ -0,0 +1,66 @@
+import logging
+import time
+
+logger = logging.getLogger("techtrolley.startup")
+
+class StartupProfiler:
+    """
+    Measures how long every phase of the application launch takes and logs the timings.
+
+    Attributes:
+    - started: perf_counter() value at which the launch started.
+    - phases: List of tuples containing the name and duration in seconds of every finished phase.
+    - finished: Boolean indicating if the launch is over and the timings were logged.
+    """
+
+    def __init__(self, started=None):
+        """
+        Initialize the StartupProfiler.
+
+        Parameters:
+        - started: perf_counter() value at which the launch started (now if omitted), e.g. taken before
+          the imports of the application.
+        """
+
+        self.started = started if started is not None else time.perf_counter()
+        self.last = self.started
+        self.phases = []
+        self.finished = False
+
+    def mark(self, phase):
+        """
+        Finish a phase, which lasted from the end of the previous one until now.
+
+        Parameters:
+        - phase: Name of the finished phase.
+        """
+
+        if self.finished:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def finish(self, phase):
+        """
+        Finish the last phase and log the timings of the launch. Later marks are ignored.
+
+        Parameters:
+        - phase: Name of the last phase.
+        """
+
+        self.mark(phase)
+        self.finished = True
+        for name, duration in self.phases:
+            logger.info("%-20s %7.1f ms", name, duration * 1000)
+        logger.info("%-20s %7.1f ms", "total", self.total() * 1000)
+
+    def total(self):
+        """
+        Get the time from the start of the launch until the end of the last finished phase.
+
+        Returns:
+        - float: The duration in seconds.
+        """
+
+        return self.last - self.started
@@ -0,0 +1,100 @@
+import os
+from collections import OrderedDict
+from PIL import Image, ImageTk
+
+class ThumbnailCache:
+    """
+    Cache of resized product images.
+
+    Ready PhotoImage objects are kept in an in-process LRU keyed by image name and size, and resized
+    thumbnails are stored on disk so a fresh start doesn't have to decode and resize the originals
+    again. Both levels are invalidated when the source image's modification time changes.
+
+    Attributes:
+    - image_dir: Directory holding the original images.
+    - cache_dir: Directory holding the resized thumbnails.
+    - capacity: Maximum number of PhotoImage objects kept in memory.
+    """
+
+    def __init__(self, image_dir="images", cache_dir="thumbnails", capacity=128):
+        """
+        Initialize the ThumbnailCache.
+
+        Parameters:
+        - image_dir: Directory holding the original images.
+        - cache_dir: Directory holding the resized thumbnails.
+        - capacity: Maximum number of PhotoImage objects kept in memory.
+        """
+
+        self.image_dir = image_dir
+        self.cache_dir = cache_dir
+        self.capacity = capacity
+        self.photos = OrderedDict()
+
+    def get(self, name, size=(200, 200)):
+        """
+        Get the image of an item, resized to the given size.
+
+        Parameters:
+        - name: Name of the image (without extension).
+        - size: Tuple containing the width and height of the thumbnail.
+
+        Returns:
+        - ImageTk.PhotoImage: The resized image, ready to be shown in a widget.
+        """
+
+        source_path = os.path.join(self.image_dir, f"{name}.png")
+        source_mtime = os.path.getmtime(source_path)
+        key = (name, size)
+
+        # Serve from memory if the source hasn't changed since it was loaded
+        cached = self.photos.get(key)
+        if cached and cached[0] == source_mtime:
+            self.photos.move_to_end(key)
+            return cached[1]
+
+        photo = ImageTk.PhotoImage(self.load_thumbnail(name, size, source_path, source_mtime))
+        self.photos[key] = (source_mtime, photo)
+        self.photos.move_to_end(key)
+        if len(self.photos) > self.capacity:
+            self.photos.popitem(last=False)
+        return photo
+
+    def load_thumbnail(self, name, size, source_path, source_mtime):
+        """
+        Load a resized image from the disk cache, creating or refreshing it when needed.
+
+        Parameters:
+        - name: Name of the image (without extension).
+        - size: Tuple containing the width and height of the thumbnail.
+        - source_path: Path of the original image.
+        - source_mtime: Modification time of the original image.
+
+        Returns:
+        - Image.Image: The resized image.
+        """
+
+        thumbnail_path = os.path.join(self.cache_dir, f"{name} {size[0]}x{size[1]}.png")
+        if os.path.exists(thumbnail_path) and os.path.getmtime(thumbnail_path) >= source_mtime:
+            try:
+                with Image.open(thumbnail_path) as thumbnail:
+                    thumbnail.load()
+                    return thumbnail
+            except OSError:
+                pass
+
+        with Image.open(source_path) as image:
+            thumbnail = image.resize(size, Image.LANCZOS)
+
+        # Write to a temporary file first so a crash never leaves a truncated thumbnail behind
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temporary_path = thumbnail_path + ".tmp"
+            thumbnail.save(temporary_path, format="PNG")
+            os.replace(temporary_path, thumbnail_path)
+        except OSError:
+            pass
+        return thumbnail
+
+# Shared cache used by every item frame
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,45 @@
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+# The application modules live flat in pages_decorated and import each other by name
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages_decorated")
+sys.path.insert(0, PACKAGE_DIR)
+
+import migrations
+from database import Database
+from ids import IdAllocator
+
+@pytest.fixture
+def seeded_conn(tmp_path):
+    """
+    Connection to a copy of the seeded database, as shipped (before any migration).
+    """
+
+    path = tmp_path / "techtrolley.db"
+    shutil.copy(os.path.join(PACKAGE_DIR, "techtrolley.db"), path)
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def db_conn(seeded_conn):
+    """
+    Connection to a copy of the seeded database with every migration applied.
+    """
+
+    migrations.migrate(seeded_conn)
+    return seeded_conn
+
+@pytest.fixture
+def ids(db_conn, tmp_path):
+    """
+    IdAllocator reserving IDs in the migrated copy of the seeded database.
+    """
+
+    allocator = IdAllocator(Database(tmp_path / "techtrolley.db"))
+    yield allocator
+    allocator.close()
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+from admin import save_item
+from signup import register_customer
+
+def item(db_conn, item_id):
+    return db_conn.execute("SELECT name, brand_id, price, quantity, expiry_date, category_id FROM items WHERE item_id = ?",
+                           (item_id,)).fetchone()
+
+def test_save_item_adds_a_new_brand_and_item(db_conn, ids):
+    category_id = db_conn.execute("SELECT MIN(category_id) FROM categories").fetchone()[0]
+    item_id = save_item(db_conn, ids, "Test Crisps", "Test Brand", "Egyptian", 10.5, 4, "2030-01-01", category_id)
+
+    brand_id, = db_conn.execute("SELECT brand_id FROM brands WHERE name = 'Test Brand'").fetchone()
+    assert item(db_conn, item_id) == ("Test Crisps", brand_id, 10.5, 4, "2030-01-01", category_id)
+    assert not db_conn.in_transaction
+
+def test_save_item_updates_the_item_of_the_same_name_and_brand(db_conn, ids):
+    item_id, name, brand_name, category_id = db_conn.execute("""SELECT i.item_id, i.name, b.name, i.category_id FROM items AS i
+                                                                JOIN brands AS b ON i.brand_id = b.brand_id
+                                                                ORDER BY i.item_id LIMIT 1""").fetchone()
+    items = db_conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    assert save_item(db_conn, ids, name, brand_name, "", 99.0, 7, "2030-01-01", category_id) == item_id
+    assert item(db_conn, item_id)[2:5] == (99.0, 7, "2030-01-01")
+    assert db_conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == items
+
+def test_save_item_refuses_an_unknown_brand(db_conn, ids):
+    items = db_conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    with pytest.raises(ValueError, match="no brand named"):
+        save_item(db_conn, ids, "Test Crisps", "No Such Brand", "", 10.5, 4, "2030-01-01", 1)
+    assert db_conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == items
+    assert not db_conn.in_transaction
+
+def test_register_customer_refuses_a_registered_email(db_conn):
+    register_customer(db_conn, "new@b.com", "hash", "First", "Last", "+201012345678", False)
+    assert db_conn.execute("SELECT first_name FROM customers WHERE email = 'new@b.com'").fetchone() == ("First",)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        register_customer(db_conn, "new@b.com", "hash", "Other", "Last", "+201012345678", False)
+    assert not db_conn.in_transaction
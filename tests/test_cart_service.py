@@ -0,0 +1,68 @@
+import pytest
+
+from cart_service import add_item, change_quantity
+
+def stock(db_conn, item_id):
+    return db_conn.execute("SELECT quantity FROM items WHERE item_id = ?", (item_id,)).fetchone()[0]
+
+def in_stock_items(db_conn, count):
+    cursor = db_conn.execute("SELECT item_id, quantity FROM items WHERE quantity > 2 ORDER BY item_id LIMIT ?", (count,))
+    return cursor.fetchall()
+
+def test_add_item_creates_the_cart_and_takes_the_stock(db_conn, ids):
+    (item_id, quantity), (other_item_id, _) = in_stock_items(db_conn, 2)
+
+    cart_id = ids.next_id("shopping_carts")
+    added, line, num_cart_items, total_price = add_item(db_conn, cart_id, "a@b.com", item_id, 2)
+    assert added
+    assert db_conn.execute("SELECT customer_email FROM shopping_carts WHERE cart_id = ?", (cart_id,)).fetchone() == ("a@b.com",)
+    assert line[0] == item_id and line[3] == 2
+    assert num_cart_items == 1
+    assert stock(db_conn, item_id) == quantity - 2
+    hold = db_conn.execute("SELECT hold_expires_at FROM cart_item WHERE cart_id = ? AND item_id = ?", (cart_id, item_id))
+    assert hold.fetchone()[0] is not None
+
+    # The badge count comes from the cart, not from the page
+    added, _, num_cart_items, total_price = add_item(db_conn, cart_id, "a@b.com", other_item_id, 1)
+    assert added
+    assert num_cart_items == 2
+    assert db_conn.execute("SELECT COUNT(*) FROM shopping_carts WHERE cart_id = ?", (cart_id,)).fetchone()[0] == 1
+    assert total_price == pytest.approx(db_conn.execute("""SELECT SUM(i.price * ci.quantity) FROM cart_item AS ci
+                                                           JOIN items AS i ON i.item_id = ci.item_id
+                                                           WHERE ci.cart_id = ?""", (cart_id,)).fetchone()[0])
+
+def test_add_item_adds_to_an_existing_line(db_conn, ids):
+    (item_id, quantity), = in_stock_items(db_conn, 1)
+    cart_id = ids.next_id("shopping_carts")
+    add_item(db_conn, cart_id, "a@b.com", item_id, 1)
+    added, line, num_cart_items, _ = add_item(db_conn, cart_id, "a@b.com", item_id, 1)
+    assert added
+    assert line[3] == 2 and num_cart_items == 1
+    assert stock(db_conn, item_id) == quantity - 2
+
+def test_add_item_never_takes_more_than_the_stock(db_conn, ids):
+    (item_id, quantity), = in_stock_items(db_conn, 1)
+    carts = db_conn.execute("SELECT COUNT(*) FROM shopping_carts").fetchone()[0]
+
+    cart_id = ids.next_id("shopping_carts")
+    added, line, num_cart_items, total_price = add_item(db_conn, cart_id, "a@b.com", item_id, quantity + 1)
+    assert not added
+    assert (line, num_cart_items, total_price) == (None, 0, 0)
+    assert stock(db_conn, item_id) == quantity
+    assert db_conn.execute("SELECT COUNT(*) FROM shopping_carts").fetchone()[0] == carts
+    assert not db_conn.in_transaction
+
+    # The reserved cart is created by the next item that can be added
+    added, _, num_cart_items, _ = add_item(db_conn, cart_id, "a@b.com", item_id, 1)
+    assert added and num_cart_items == 1
+    assert db_conn.execute("SELECT COUNT(*) FROM shopping_carts").fetchone()[0] == carts + 1
+
+def test_change_quantity_removes_the_emptied_cart(db_conn, ids):
+    (item_id, quantity), = in_stock_items(db_conn, 1)
+    cart_id = ids.next_id("shopping_carts")
+    add_item(db_conn, cart_id, "a@b.com", item_id, 1)
+
+    changed, line, num_cart_items, _ = change_quantity(db_conn, cart_id, item_id, -1)
+    assert changed and line is None and num_cart_items == 0
+    assert stock(db_conn, item_id) == quantity
+    assert db_conn.execute("SELECT COUNT(*) FROM shopping_carts WHERE cart_id = ?", (cart_id,)).fetchone()[0] == 0
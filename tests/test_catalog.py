@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from catalog import CatalogSnapshot
+from home import load_items
+
+NO_FILTERS = (None, None, None, None, None, False, None)
+
+def search(search_text):
+    return (None, None, None, None, None, False, search_text)
+
+def item_ids(rows):
+    return [row[0] for row in rows]
+
+def test_snapshot_is_off_unless_asked_for():
+    assert not CatalogSnapshot().enabled
+    assert CatalogSnapshot(enabled=True).enabled
+
+@pytest.mark.parametrize("search_text", ['"', "- ...", "choc -", "snacks", "coca-cola", "bakery br"])
+def test_search_matches_the_database(db_conn, search_text):
+    catalog = CatalogSnapshot(enabled=True)
+    rows, _ = catalog.query(db_conn, search(search_text), None, 1000)
+    expected, _ = load_items(db_conn, search(search_text), None, 1000)
+    assert sorted(item_ids(rows)) == sorted(item_ids(expected))
+
+def test_search_words_without_letters_match_nothing(db_conn):
+    catalog = CatalogSnapshot(enabled=True)
+    assert catalog.query(db_conn, NO_FILTERS, None, 1000)[0]
+    assert catalog.query(db_conn, search('"'), None, 1000)[0] == []
+
+def test_snapshot_reloads_after_a_commit_by_another_connection(db_conn, tmp_path):
+    catalog = CatalogSnapshot(enabled=True)
+    rows, _ = catalog.query(db_conn, NO_FILTERS, None, 1)
+    item_id = rows[0][0]
+
+    # Another terminal sells out the first item, without invalidating this process's snapshot
+    other_conn = sqlite3.connect(tmp_path / "techtrolley.db")
+    other_conn.execute("UPDATE items SET quantity = 0 WHERE item_id = ?", (item_id,))
+    other_conn.commit()
+    other_conn.close()
+
+    rows, _ = catalog.query(db_conn, NO_FILTERS, None, 1)
+    assert rows[0][0] != item_id
+
+def test_snapshot_is_reused_without_writes(db_conn):
+    catalog = CatalogSnapshot(enabled=True)
+    catalog.query(db_conn, NO_FILTERS, None, 10)
+    loaded_at = catalog.loaded_at
+    catalog.query(db_conn, search("snacks"), None, 10)
+    assert catalog.loaded_at == loaded_at
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from home import item_stats_values, load_items
+
+# The home page query before the aggregates were moved into CTEs and summary tables, with three
+# intentional fixes applied so the results are comparable: units sold only count paid cart lines
+# (the old subquery also counted the lines of unpaid carts), units sold in the last 24 hours are
+# counted per item (the old subquery summed every item) and discount windows are compared with
+# the reference date (the old query bound a datetime and lost the last day of every window).
+OLD_ITEM_QUERY = """
+    SELECT i.item_id, i.name, i.quantity, i.price, b.name, b.nationality,
+    (SELECT SUM(quantity) FROM cart_item AS ci JOIN payments AS p ON ci.cart_id = p.cart_id
+     WHERE ci.item_id = i.item_id) AS sold,
+    (SELECT SUM(quantity) FROM cart_item AS ci JOIN payments AS p ON ci.cart_id = p.cart_id
+     WHERE p.payment_date >= ? AND ci.item_id = i.item_id) AS sold_24h,
+    (SELECT discount_amount FROM discounts WHERE item_id = i.item_id AND start_date <= ? AND end_date >= ?) AS discount,
+    (SELECT SUM(share) FROM stakeholders WHERE nationality = 'Egyptian' AND brand_id = i.brand_id GROUP BY brand_id) AS egyptian_share
+    FROM items i
+    JOIN brands b ON i.brand_id = b.brand_id
+"""
+
+# Reference times on the hour, so the hourly sales buckets start exactly one day earlier. The seeded
+# sales end in 2023 and its discount windows in 2024, so the last one is the day two windows end.
+REFERENCE_TIMES = [datetime(2023, 8, 19, 9), datetime(2023, 10, 19, 12), datetime(2023, 12, 29, 0),
+                   datetime(2024, 1, 2, 15)]
+
+@pytest.fixture(autouse=True)
+def unpaid_item_id(db_conn):
+    """
+    Put some of the first item in stock in an unpaid cart, which must not count as sold.
+    """
+
+    item_id = db_conn.execute("SELECT MIN(item_id) FROM items WHERE quantity > 0").fetchone()[0]
+    cart_id = db_conn.execute("SELECT MAX(cart_id) + 1 FROM shopping_carts").fetchone()[0]
+    db_conn.execute("INSERT INTO shopping_carts (cart_id, customer_email, creation_time) VALUES (?, 'a@b.com', '2023-10-19')",
+                    (cart_id,))
+    db_conn.execute("INSERT INTO cart_item (cart_id, item_id, quantity) VALUES (?, ?, 3)", (cart_id, item_id))
+    db_conn.commit()
+    return item_id
+
+def old_items(db_conn, current_time, brand_name=None, brand_nationality=None, min_price=None, max_price=None,
+              on_discount=False):
+    """
+    Run the old query for every page at once, keeping the items in stock as the old page did.
+    """
+
+    today = current_time.date().isoformat()
+    query = OLD_ITEM_QUERY
+    values = (current_time - timedelta(days=1), today, today)
+    filters = []
+    if brand_name:
+        filters.append("b.name = ?")
+        values += (brand_name,)
+    if brand_nationality:
+        filters.append("b.nationality = ?")
+        values += (brand_nationality,)
+    if min_price:
+        filters.append("i.price >= ?")
+        values += (min_price,)
+    if max_price:
+        filters.append("i.price <= ?")
+        values += (max_price,)
+    if on_discount:
+        filters.append("i.item_id IN (SELECT item_id FROM discounts)")
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    query += " ORDER BY i.item_id"
+    return [row for row in db_conn.execute(query, values).fetchall() if row[2] > 0]
+
+def new_items(db_conn, current_time, filters, limit=7):
+    """
+    Page through load_items until the last page.
+    """
+
+    rows, page_cursor = load_items(db_conn, filters, None, limit, current_time)
+    while page_cursor:
+        page, page_cursor = load_items(db_conn, filters, page_cursor, limit, current_time)
+        rows += page
+    return [row[:10] for row in rows]
+
+def assert_same_items(old, new):
+    assert [row[:8] for row in new] == [tuple(row[:8]) for row in old]
+    assert [row[8] for row in new] == [row[8] for row in old]
+    assert [row[9] for row in new] == pytest.approx([row[9] for row in old])
+
+def test_discount_windows_are_compared_with_the_date_of_refresh_discounts(db_conn):
+    # refresh_discounts compares the windows with SQLite's DATE('now'), the UTC date
+    assert item_stats_values()[1:] == db_conn.execute("SELECT DATE('now'), DATE('now')").fetchone()
+
+def test_sales_of_the_last_24_hours_start_with_the_utc_hour_of_the_payments(db_conn):
+    # Payments are dated with SQLite's datetime('now'), the UTC time, and bucketed by hour
+    start = db_conn.execute("SELECT strftime('%Y-%m-%d %H:00:00', 'now', '-1 day')").fetchone()[0]
+    assert item_stats_values()[0] == start
+
+def test_reference_times_cover_recent_sales_and_ending_discounts(db_conn):
+    for current_time in REFERENCE_TIMES[:3]:
+        assert any(row[7] for row in old_items(db_conn, current_time))
+    ending = db_conn.execute("SELECT COUNT(*) FROM discounts WHERE end_date = ?",
+                             (REFERENCE_TIMES[3].date().isoformat(),)).fetchone()[0]
+    assert ending > 0
+
+def test_unpaid_cart_lines_are_not_sold(db_conn, unpaid_item_id):
+    new = {row[0]: row for row in new_items(db_conn, REFERENCE_TIMES[0], (None, None, None, None, None, False, None))}
+    paid = db_conn.execute("""SELECT SUM(ci.quantity) FROM cart_item AS ci JOIN payments AS p ON ci.cart_id = p.cart_id
+                              WHERE ci.item_id = ?""", (unpaid_item_id,)).fetchone()[0]
+    assert new[unpaid_item_id][6] == paid
+
+@pytest.mark.parametrize("current_time", REFERENCE_TIMES)
+def test_items_match_the_old_query(db_conn, current_time):
+    old = old_items(db_conn, current_time)
+    assert any(row[8] for row in old)
+    assert_same_items(old, new_items(db_conn, current_time, (None, None, None, None, None, False, None)))
+
+@pytest.mark.parametrize("current_time", REFERENCE_TIMES)
+def test_filtered_items_match_the_old_query(db_conn, current_time):
+    brand_name, brand_nationality = db_conn.execute("""SELECT b.name, b.nationality FROM items i
+                                                       JOIN brands b ON i.brand_id = b.brand_id
+                                                       ORDER BY i.item_id LIMIT 1""").fetchone()
+
+    old = old_items(db_conn, current_time, brand_name=brand_name)
+    assert_same_items(old, new_items(db_conn, current_time, (brand_name, None, None, None, None, False, None)))
+
+    old = old_items(db_conn, current_time, brand_nationality=brand_nationality, min_price=100, max_price=2000)
+    new = new_items(db_conn, current_time, (None, brand_nationality, None, 100, 2000, False, None))
+    assert_same_items(old, new)
+
+    old = old_items(db_conn, current_time, on_discount=True)
+    assert_same_items(old, new_items(db_conn, current_time, (None, None, None, None, None, True, None)))
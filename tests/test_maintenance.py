@@ -0,0 +1,49 @@
+import maintenance
+from home import item_stats_values
+
+def active_windows(db_conn, item_id):
+    """
+    List the discount windows of an item that are active today, oldest first.
+    """
+
+    cursor = db_conn.execute("""SELECT discount_id FROM discounts
+                                WHERE item_id = ? AND start_date <= DATE('now') AND end_date >= DATE('now')
+                                ORDER BY discount_id""", (item_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+def test_compact_discounts_keeps_the_shown_window_of_daily_refreshes(db_conn):
+    # Legacy data: a 7-day window was created on every launch, here once a day for the last 10 days
+    item_id = db_conn.execute("SELECT MIN(item_id) FROM items").fetchone()[0]
+    db_conn.execute("DELETE FROM discounts WHERE item_id = ?", (item_id,))
+    for days_ago in range(9, -1, -1):
+        db_conn.execute("""INSERT INTO discounts (discount_id, item_id, discount_amount, start_date, end_date)
+                           VALUES ((SELECT MAX(discount_id) + 1 FROM discounts), ?, 10,
+                                   DATE('now', ?), DATE('now', ?))""",
+                        (item_id, f"-{days_ago} day", f"{7 - days_ago:+d} day"))
+    db_conn.commit()
+    before = active_windows(db_conn, item_id)
+    assert len(before) == 8
+
+    maintenance.compact_discounts(db_conn)
+
+    # The earliest active window is the one customers see, and it survives alone
+    assert active_windows(db_conn, item_id) == before[:1]
+    assert db_conn.execute("SELECT COUNT(*) FROM discounts WHERE item_id = ?", (item_id,)).fetchone()[0] == 1
+
+def test_compact_discounts_removes_expired_windows(db_conn):
+    maintenance.compact_discounts(db_conn)
+    expired = db_conn.execute("SELECT COUNT(*) FROM discounts WHERE end_date < DATE('now')").fetchone()[0]
+    assert expired == 0
+
+def test_prune_sales_keeps_the_buckets_of_the_last_24_hours(db_conn):
+    # Buckets are keyed by the UTC hour of the payment, like the bound of the home page
+    item_id = db_conn.execute("SELECT MIN(item_id) FROM items").fetchone()[0]
+    db_conn.execute("DELETE FROM item_sales_hourly")
+    for hours_ago in (0, 23, 24, 60):
+        db_conn.execute("""INSERT INTO item_sales_hourly (hour, item_id, sold)
+                           VALUES (strftime('%Y-%m-%d %H:00:00', 'now', ?), ?, 1)""", (f"-{hours_ago} hours", item_id))
+    db_conn.commit()
+
+    assert maintenance.prune_sales(db_conn) == 1
+    hours = db_conn.execute("SELECT COUNT(*) FROM item_sales_hourly WHERE hour >= ?", (item_stats_values()[0],))
+    assert hours.fetchone()[0] == 3
@@ -0,0 +1,27 @@
+import sqlite3
+
+import migrations
+
+def test_migrations_already_applied_by_another_terminal_are_skipped(seeded_conn, tmp_path, monkeypatch):
+    other_conn = sqlite3.connect(tmp_path / "techtrolley.db")
+    read_version = migrations.schema_version
+    started = []
+
+    # Another terminal migrates the database right after this one read the version
+    def version_read_before_the_other_terminal_migrates(db_conn):
+        version = read_version(db_conn)
+        if db_conn is seeded_conn and not started:
+            started.append(True)
+            migrations.migrate(other_conn)
+        return version
+
+    monkeypatch.setattr(migrations, "schema_version", version_read_before_the_other_terminal_migrates)
+    latest = migrations.MIGRATIONS[-1][0]
+    assert migrations.migrate(seeded_conn) == latest
+    assert read_version(seeded_conn) == latest
+    other_conn.close()
+
+def test_migrate_is_a_no_op_on_an_up_to_date_database(db_conn):
+    schema = db_conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall()
+    assert migrations.migrate(db_conn) == migrations.MIGRATIONS[-1][0]
+    assert db_conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall() == schema
@@ -0,0 +1,59 @@
+import pytest
+
+from cart_service import add_item
+from payment import record_payment
+from reservations import release_expired_holds
+
+@pytest.fixture
+def cart(db_conn, ids):
+    """
+    A cart with two reserved lines, and the IDs of their items.
+    """
+
+    item_ids = [row[0] for row in db_conn.execute("SELECT item_id FROM items WHERE quantity > 2 ORDER BY item_id LIMIT 2")]
+    cart_id = ids.next_id("shopping_carts")
+    add_item(db_conn, cart_id, "a@b.com", item_ids[0], 2)
+    add_item(db_conn, cart_id, "a@b.com", item_ids[1], 1)
+    return cart_id, item_ids
+
+def expire_hold(db_conn, cart_id, item_id):
+    db_conn.execute("UPDATE cart_item SET hold_expires_at = datetime('now', '-1 minute') WHERE cart_id = ? AND item_id = ?",
+                    (cart_id, item_id))
+    db_conn.commit()
+    release_expired_holds(db_conn)
+
+def payments(db_conn, cart_id):
+    return db_conn.execute("SELECT payment_id, total_price FROM payments WHERE cart_id = ?", (cart_id,)).fetchall()
+
+def test_payment_charges_the_lines_in_the_cart(db_conn, ids, cart):
+    cart_id, item_ids = cart
+    discount, code = db_conn.execute("SELECT discount_amount, code FROM promocodes LIMIT 1").fetchone()
+    subtotal = db_conn.execute("""SELECT SUM(i.price * ci.quantity) FROM cart_item AS ci
+                                  JOIN items AS i ON i.item_id = ci.item_id
+                                  WHERE ci.cart_id = ?""", (cart_id,)).fetchone()[0]
+
+    payment_id, total_price = record_payment(db_conn, ids, cart_id, 2, "Cash on Delivery", [code])
+    assert total_price == round(subtotal * (1 - discount / 100), 2)
+    assert payments(db_conn, cart_id) == [(payment_id, total_price)]
+    assert db_conn.execute("SELECT COUNT(*) FROM cart_item WHERE cart_id = ? AND hold_expires_at IS NOT NULL",
+                           (cart_id,)).fetchone()[0] == 0
+    assert db_conn.execute("SELECT sold FROM item_sales WHERE item_id = ?", (item_ids[1],)).fetchone()[0] >= 1
+
+def test_payment_fails_when_a_line_was_released(db_conn, ids, cart):
+    cart_id, item_ids = cart
+    expire_hold(db_conn, cart_id, item_ids[0])
+
+    with pytest.raises(ValueError, match="some of the reserved items"):
+        record_payment(db_conn, ids, cart_id, 2, "Cash on Delivery", [])
+    assert payments(db_conn, cart_id) == []
+    assert db_conn.execute("SELECT hold_expires_at FROM cart_item WHERE cart_id = ?", (cart_id,)).fetchone()[0] is not None
+    assert not db_conn.in_transaction
+
+def test_payment_fails_when_every_line_was_released(db_conn, ids, cart):
+    cart_id, item_ids = cart
+    for item_id in item_ids:
+        expire_hold(db_conn, cart_id, item_id)
+
+    with pytest.raises(ValueError, match="the reserved items were released"):
+        record_payment(db_conn, ids, cart_id, 2, "Cash on Delivery", [])
+    assert payments(db_conn, cart_id) == []